@@ -0,0 +1,226 @@
+import argparse
+import itertools
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import uw
+
+TICK_BUDGET_MS = 50.0
+
+SECTIONS = (
+    "tick",
+    "Map._load",
+    "Map._updating",
+    "World._updating",
+    "World._update_removed",
+    "World._update_modified",
+    "World._update_policies",
+    "Prototypes._load_prototypes",
+    "Game._shooting_callback",
+)
+
+# callbacks fired by the backend, timed including the cffi transition
+_FIRED = {
+    "uwSetUpdateCallback": "tick",
+    "uwSetShootingCallback": "Game._shooting_callback",
+}
+
+
+class Recorder:
+    def __init__(self, allocations: bool):
+        self.allocations = allocations
+        self.times: dict[str, list[float]] = {s: [] for s in SECTIONS}
+        self.allocated: dict[str, list[int]] = {s: [] for s in SECTIONS}
+        self.peaks: dict[str, list[int]] = {s: [] for s in SECTIONS}
+
+    def timed(self, section: str, function):
+        if self.allocations:
+
+            def measured(*args):
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                result = function(*args)
+                current, peak = tracemalloc.get_traced_memory()
+                self.allocated[section].append(current - before)
+                self.peaks[section].append(peak - before)
+                return result
+
+        else:
+
+            def measured(*args):
+                start = time.perf_counter()
+                result = function(*args)
+                self.times[section].append(time.perf_counter() - start)
+                return result
+
+        return measured
+
+
+def _instrument(recorder: Recorder, game: uw.Game, backend: uw.SyntheticBackend):
+    targets = (
+        ("Map", game.map, ("_load", "_updating")),
+        (
+            "World",
+            game.world,
+            ("_updating", "_update_removed", "_update_modified", "_update_policies"),
+        ),
+        ("Prototypes", game.prototypes, ("_load_prototypes",)),
+    )
+    handlers = (game._updating_handler, game._map_state_changed_handler)
+    for prefix, obj, names in targets:
+        for name in names:
+            original = getattr(obj, name)
+            measured = recorder.timed(f"{prefix}.{name}", original)
+            setattr(obj, name, measured)
+            # handlers registered in the constructor hold the bound method
+            for handler in handlers:
+                for i, eh in enumerate(handler):
+                    if eh == original:
+                        handler[i] = measured
+
+    fire = backend._fire
+
+    def fired(setter: str, *args):
+        section = _FIRED.get(setter)
+        if section is None:
+            return fire(setter, *args)
+        return recorder.timed(section, fire)(setter, *args)
+
+    backend._fire = fired
+
+
+def run(scenario: dict, ticks: int, allocations: bool, seed: int) -> Recorder:
+    recorder = Recorder(allocations)
+    backend = uw.SyntheticBackend(
+        tiles=scenario["tiles"],
+        entities=scenario["entities"],
+        modified=scenario["modified"],
+        churn=scenario["churn"],
+        shooting=1 if scenario["shots"] > 0 else 0,
+        burst=scenario["shots"],
+        ticks=ticks,
+        seed=seed,
+    )
+    game = uw.Game(backend=backend)
+    _instrument(recorder, game, backend)
+    if allocations:
+        tracemalloc.start()
+    try:
+        game.connect_new_server()
+    finally:
+        if allocations:
+            tracemalloc.stop()
+    return recorder
+
+
+def summarize(timings: Recorder, allocations: Recorder = None) -> dict:
+    summary = {}
+    for section in SECTIONS:
+        times = np.array(timings.times[section]) * 1000
+        if len(times) == 0:
+            continue
+        entry = {
+            "calls": len(times),
+            "p50": float(np.percentile(times, 50)),
+            "p90": float(np.percentile(times, 90)),
+            "p99": float(np.percentile(times, 99)),
+            "max": float(times.max()),
+        }
+        if allocations is not None and allocations.allocated[section]:
+            entry["allocated_kib"] = float(np.mean(allocations.allocated[section])) / 1024
+            entry["peak_kib"] = float(np.max(allocations.peaks[section])) / 1024
+        summary[section] = entry
+    if "tick" in summary:
+        over = np.array(timings.times["tick"]) * 1000 > TICK_BUDGET_MS
+        summary["tick"]["over_budget"] = int(over.sum())
+    return summary
+
+
+def scenario_key(scenario: dict) -> str:
+    return ",".join(f"{k}={v}" for k, v in sorted(scenario.items()))
+
+
+def print_summary(key: str, summary: dict, baseline: dict, tolerance: float) -> bool:
+    print(f"\n{key}")
+    print(
+        f"{'section':<30}{'calls':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+        f"{'max ms':>10}{'alloc KiB':>11}{'peak KiB':>10}{'vs base':>9}"
+    )
+    regressed = False
+    for section, entry in summary.items():
+        compared = ""
+        base = baseline.get(section)
+        if base is not None and base["p50"] > 0:
+            ratio = entry["p50"] / base["p50"]
+            compared = f"{ratio:.2f}x"
+            if ratio > 1 + tolerance:
+                compared += " !"
+                regressed = True
+        print(
+            f"{section:<30}{entry['calls']:>7}{entry['p50']:>10.3f}"
+            f"{entry['p90']:>10.3f}{entry['p99']:>10.3f}{entry['max']:>10.3f}"
+            f"{entry.get('allocated_kib', float('nan')):>11.1f}"
+            f"{entry.get('peak_kib', float('nan')):>10.1f}{compared:>9}"
+        )
+    over = summary.get("tick", {}).get("over_budget", 0)
+    if over:
+        print(f"{over} ticks over the {TICK_BUDGET_MS:.0f} ms budget")
+    return regressed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="per-tick costs of the python bindings on synthetic worlds"
+    )
+    parser.add_argument("--entities", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--modified", type=float, nargs="+", default=[0.05])
+    parser.add_argument("--tiles", type=int, nargs="+", default=[10000])
+    parser.add_argument("--shots", type=int, nargs="+", default=[20])
+    parser.add_argument("--churn", type=float, nargs="+", default=[0.001])
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-allocations", action="store_true")
+    parser.add_argument("--save", help="write the results as a baseline file")
+    parser.add_argument("--compare", help="baseline file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    baselines = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baselines = json.load(f)
+
+    results = {}
+    regressed = False
+    grid = itertools.product(
+        args.entities, args.modified, args.tiles, args.shots, args.churn
+    )
+    for entities, modified, tiles, shots, churn in grid:
+        scenario = {
+            "entities": entities,
+            "modified": modified,
+            "tiles": tiles,
+            "shots": shots,
+            "churn": churn,
+        }
+        key = scenario_key(scenario)
+        timings = run(scenario, args.ticks, False, args.seed)
+        allocations = None
+        if not args.no_allocations:
+            allocations = run(scenario, args.ticks, True, args.seed)
+        results[key] = summarize(timings, allocations)
+        if print_summary(key, results[key], baselines.get(key, {}), args.tolerance):
+            regressed = True
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -44,9 +44,18 @@ class Bot:
         self.last_commands = {}
         self.config = {}
 
+        self.spatial = uw.SpatialIndex(self.game)
+        self.influence = uw.InfluenceMap(self.game)
+
         # register update callback
         self.game.add_update_callback(self.update_callback_closure())
 
+        # combat reacts first when a tick is short on time
+        self.scheduler = uw.Scheduler(self.game, budget_ms=20)
+        self.scheduler.add_task("combat", self.combat, priority=10, period=10)
+        self.scheduler.add_task("build", self.build, priority=0, period=10, offset=4)
+        self.scheduler.add_task("config", self.load_config, priority=-10, period=20)
+
     def get_unit_name(self, unit) -> str:
         u = self.game.prototypes.unit(unit.Proto.proto)
         if u is None:
@@ -90,20 +99,21 @@ class Bot:
 
     def get_closest_ores(self):
         self.resources_map = defaultdict(list)
-        for e in self.game.world.entities().values():
-            if not (hasattr(e, "Unit")) and not e.own():
-                continue
-            unit_name = self.get_unit_name(e)
+        for proto, unit_name in self.unit_prototype_id_map.items():
             if "deposit" not in unit_name:
                 continue
             name = unit_name.replace(" deposit", "")
-            self.resources_map[name].append(e)
+            for e in self.game.world.by_proto(proto):
+                if not (hasattr(e, "Unit")) and not e.own():
+                    continue
+                self.resources_map[name].append(e)
 
         if not self.main_building:
             return
-        for r in self.resources_map:
-            self.resources_map[r].sort(key=lambda x: self.game.map.distance_estimate(
-                self.main_building.Position.position, x.Position.position
+        base = self.main_building.Position.position
+        for deposits in self.resources_map.values():
+            deposits.sort(key=lambda x: self.game.map.distance_estimate(
+                base, x.Position.position, cached=True
             ))
 
     def start(self):
@@ -126,8 +136,9 @@ class Bot:
             else:
                 self.game.connect_new_server(extra_params="-m planets/triangularprism.uw")
 
-        os.kill(pid, signal.SIGTERM)
         self.game.log_info("done")
+        self.game.close()
+        os.kill(pid, signal.SIGTERM)
 
     def get_resources(self):
         if self.resources:
@@ -142,27 +153,31 @@ class Bot:
     def find_own_combat_units(self) -> list:
         return [
             e
-            for e in self.game.world.entities().values()
-            if e.own()
-               and e.has("Unit")
-               and self.game.prototypes.unit(e.Proto.proto)
-               and self.get_unit_name(e) != "nucleus"
+            for e in self.game.world.query(own=True, has=("Unit",), proto_type=Prototype.Unit)
+            if self.get_unit_name(e) != "nucleus"
                and self.game.prototypes.unit(e.Proto.proto).get("dps", 0) > 0
         ]
 
     def combat(self):
         if self.config["combat_mode"] == str(CombatMode.ATTACK.value):
-            self.attack_nearest_enemies()
+            yield from self.attack_nearest_enemies()
         elif self.config["combat_mode"] == str(CombatMode.DEFEND.value):
-            self.go_to_nucleus()
+            yield from self.go_to_nucleus()
         else:
             own_units = self.find_own_combat_units()
             if not own_units:
                 return
-            if len(own_units) >= 10:
-                self.attack_nearest_enemies()
+            if self.stronger_than_enemy(own_units):
+                yield from self.attack_nearest_enemies()
             else:
-                self.go_to_nucleus()
+                yield from self.go_to_nucleus()
+
+    def stronger_than_enemy(self, own_units) -> bool:
+        # our strength where our army stands against the enemy's strongest spot
+        positions = [u.Position.position for u in own_units]
+        own = float(self.influence.own()[positions].max())
+        enemy = float(self.influence.enemy().max(initial=0))
+        return own >= self.config.get("attack_ratio", 1.2) * enemy
 
     def build(self):
         if self.config["build_mode"] == str(BuildMode.EAGLE.value):
@@ -173,31 +188,34 @@ class Bot:
             self.execute_juggernaut_strategy()
 
     def attack_nearest_enemies(self):
-        own_units = self.find_own_combat_units()
-        if not own_units:
-            return
-        enemy_units = [
-            e
-            for e in self.game.world.entities().values()
-            if e.policy() == uw.Policy.Enemy and e.has("Unit")
+        own_units = [
+            u
+            for u in self.find_own_combat_units()
+            if self.last_commands.get(u.Id) == CombatMode.DEFEND
+            or not self.game.commands.has_orders(u.Id)
         ]
-        if not enemy_units:
+        if not own_units:
             return
-        for u in own_units:
-            _id = u.Id
+        # straight line distance picks the candidates, the walking estimate the target
+        candidates = self.spatial.k_nearest_many(
+            [u.Position.position for u in own_units],
+            k=8,
+            policy=uw.Policy.Enemy,
+            has=("Unit",),
+        )
+        for u, nearest in zip(own_units, candidates):
+            if not nearest:
+                return
             pos = u.Position.position
-            if (_id in self.last_commands and self.last_commands[_id] == CombatMode.DEFEND) or len(self.game.commands.orders(_id)) == 0:
-                enemy = sorted(
-                    enemy_units,
-                    key=lambda x: self.game.map.distance_estimate(
-                        pos, x.Position.position
-                    ),
-                )[0]
-                self.game.commands.order(
-                    _id, self.game.commands.fight_to_entity(enemy.Id)
-                )
-                print("Unit "+self.get_unit_name(u)+" is attacking")
-                self.last_commands[_id] = CombatMode.ATTACK
+            enemy = min(nearest, key=lambda x: self.game.map.distance_estimate(
+                pos, x.Position.position, cached=True
+            ))
+            self.game.commands.order(
+                u.Id, self.game.commands.fight_to_entity(enemy.Id)
+            )
+            print("Unit "+self.get_unit_name(u)+" is attacking")
+            self.last_commands[u.Id] = CombatMode.ATTACK
+            yield
 
     def go_to_nucleus(self):
         own_units = self.find_own_combat_units()
@@ -205,17 +223,16 @@ class Bot:
             return
         for u in own_units:
             _id = u.Id
-            if (_id in self.last_commands and self.last_commands[_id] == CombatMode.ATTACK) or len(self.game.commands.orders(_id)) == 0:
+            if (_id in self.last_commands and self.last_commands[_id] == CombatMode.ATTACK) or not self.game.commands.has_orders(_id):
                 self.game.commands.order(
                     _id, self.game.commands.run_to_entity(self.main_building.Id)
                 )
                 print("Unit " + self.get_unit_name(u) + " is defending")
                 self.last_commands[_id] = CombatMode.DEFEND
+            yield
 
     def assign_recipe(self, recipe_name: str):
-        for e in self.game.world.entities().values():
-            if not (e.own() and hasattr(e, "Unit")):
-                continue
+        for e in self.game.world.query(own=True, has=("Unit",)):
             recipes = self.game.prototypes.unit(e.Proto.proto)
             if not recipes:
                 continue
@@ -226,33 +243,19 @@ class Bot:
                     break
 
     def find_own_constructions(self) -> list: # list of entities
-        construction_entities = []
-        for e in self.game.world.entities().values():
-            if not e.own():
-                continue
-            if e.Proto.proto in self.construction_prototype_id_map:
-                construction_entities.append(e)
-        return construction_entities
+        return list(self.game.world.query(own=True, proto_type=Prototype.Construction))
 
     def find_own_units(self) -> list: # list of entities
-        unit_entities = []
-        for e in self.game.world.entities().values():
-            if not e.own():
-                continue
-            if e.Proto.proto in self.unit_prototype_id_map:
-                unit_entities.append(e)
-        return unit_entities
+        return list(self.game.world.query(own=True, proto_type=Prototype.Unit))
 
 
     def find_own_units_with_name(self, building_name: str) -> list[Entity]:
         return list(filter(lambda x: self.unit_prototype_id_map[x.Proto.proto] == building_name, self.find_own_units()))
 
     def find_own_units_and_constructions_of_name(self, name: str):
-        constructions = self.find_own_constructions()
-        units = self.find_own_units()
-        filtered_c = list(filter(lambda x: self.construction_prototype_id_map[x.Proto.proto] == name, constructions))
-        filtered_u = list(filter(lambda x: self.unit_prototype_id_map[x.Proto.proto] == name, units))
-        return filtered_c + filtered_u
+        constructions = self.game.world.query(own=True, proto_type=Prototype.Construction, proto_name=name)
+        units = self.game.world.query(own=True, proto_type=Prototype.Unit, proto_name=name)
+        return list(constructions) + list(units)
 
     def find_placement_and_build_construction(self, construction_name: str, position: int) -> bool:
         if self.anything_in_construction():
@@ -380,12 +383,11 @@ class Bot:
     def find_units_or_constructions_on_position(self, position) -> list:
         result = []
         for n in self.game.map.neighbors_of_position(position):
-            for c in self.find_own_constructions():
-                if c.Position.position == n:
-                    result.append(c)
-            for u in self.find_own_units():
-                if u.Position.position == n:
-                    result.append(u)
+            for e in self.game.world.at_tile(n):
+                if not e.own():
+                    continue
+                if e.Proto.proto in self.construction_prototype_id_map or e.Proto.proto in self.unit_prototype_id_map:
+                    result.append(e)
         return result
 
     def building_on_deposit(self, building: Entity, resource_type: str) -> bool:
@@ -408,7 +410,7 @@ class Bot:
         return -1
 
     def anything_in_construction(self):
-        return len(self.find_own_constructions()) > 0
+        return self.game.world.count(own=True, proto_type=Prototype.Construction) > 0
 
     def execute_juggernaut_strategy(self):
         # Iron drill
@@ -514,25 +516,16 @@ class Bot:
         def update_callback(stepping):
             if not stepping:
                 return
-            self.step += 1  # save some cpu cycles by splitting work over multiple steps
+            self.step += 1
 
             self.find_main_base()
             self.init_prototypes()
 
             self.resources = None
 
-            if self.step % 20 == 1:
-                self.load_config()
-
             if self.resources_map is None:
                 self.get_closest_ores()
 
-            if self.step % 10 == 1:
-                self.combat()
-
-            if self.step % 10 == 5:
-                self.build()
-
             try:
                 # print("trying to destroy")
                 # self.destroy_constructions()
@@ -4,6 +4,8 @@
     Unnatural Worlds API
 """
 
+import os
+
 from setuptools import setup, find_packages  # noqa: H301
 
 # To install the library, run the following
@@ -13,11 +15,22 @@ from setuptools import setup, find_packages  # noqa: H301
 # prerequisite: setuptools
 # http://pypi.python.org/pypi/setuptools
 NAME = "unnatural-worlds-api"
-VERSION = "21.6.8"
+VERSION = "21.7.0"
 PYTHON_REQUIRES = ">=3.7"
 REQUIRES = [
+    "cffi>=1.15",
+    "numpy",
 ]
 
+# uw/_bots.py is generated from uw/bots.h (make header), see uw/_build_ffi.py;
+# without the header the bindings parse it at runtime instead
+HEADER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uw", "bots.h")
+CFFI_MODULES = []
+if os.path.exists(HEADER):
+    CFFI_MODULES.append("uw/_build_ffi.py:ffibuilder")
+    if os.environ.get("UW_BUILD_API") == "1" and os.environ.get("UNNATURAL_ROOT"):
+        CFFI_MODULES.append("uw/_build_ffi.py:api_builder")
+
 setup(
     name=NAME,
     version=VERSION,
@@ -27,6 +40,8 @@ setup(
     url="",
     keywords=["uw", "unnatural worlds"],
     install_requires=REQUIRES,
+    setup_requires=["cffi>=1.15"],
+    cffi_modules=CFFI_MODULES,
     packages=find_packages(exclude=["test", "tests"]),
     include_package_data=True,
     long_description_content_type='text/markdown',
@@ -0,0 +1,25 @@
+import uw
+
+
+def synthetic_game(game_options: dict = None, **backend_options) -> uw.Game:
+    options = {"tiles": 2000, "entities": 300, "ticks": 30}
+    options.update(backend_options)
+    return uw.Game(backend=uw.SyntheticBackend(**options), **(game_options or {}))
+
+
+# exceptions raised inside game callbacks do not propagate out of the backend,
+# so they are collected and raised once the session ends
+def play(game: uw.Game, updating=None):
+    errors = []
+
+    def checked(stepping: bool):
+        try:
+            updating(stepping)
+        except Exception as e:
+            errors.append(e)
+
+    if updating is not None:
+        game.add_update_callback(checked)
+    game.connect_new_server()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,38 @@
+import asyncio
+
+import uw
+
+from uw import Order
+from uw import OrderPriority
+from uw import OrderType
+
+from . import synthetic_game
+
+
+def test_coroutine_commands_are_sent_from_the_update_callback():
+    game = synthetic_game(ticks=40, tick_rate=200, churn=0)
+    agame = uw.AsyncGame(game)
+    state = {}
+
+    def updating(stepping: bool):
+        if stepping and "unit" in state:
+            state["orders"] = game.commands.orders_view(state["unit"])
+
+    async def behaviour():
+        await agame.next_tick()
+        snapshot = await agame.next_snapshot()
+        unit = sorted(o.Id for o in game.world.query(has=("Move",)))[0]
+        order = Order(uw.Commands.invalid, 10, OrderType.Run, OrderPriority.User)
+        agame.commands.order(unit, order)
+        agame.commands.order(snapshot.tick + 10**6, order)
+        state["unit"] = unit
+
+    async def main():
+        task = asyncio.create_task(behaviour())
+        await agame.connect_new_server()
+        await task
+
+    game.add_update_callback(updating)
+    asyncio.run(main())
+    assert [o[:3] for o in state["orders"]] == [(uw.Commands.invalid, 10, 3)]
+    assert not agame.commands.queued()
@@ -0,0 +1,94 @@
+import uw
+
+from uw import Order
+from uw import OrderPriority
+from uw import OrderType
+
+from . import play
+from . import synthetic_game
+
+
+INVALID = uw.Commands.invalid
+
+
+def position_order(order_type: OrderType, position: int, enqueue: bool = False):
+    priority = OrderPriority.User
+    if enqueue:
+        priority |= OrderPriority.Enqueue
+    return Order(INVALID, position, order_type, priority)
+
+
+def issue_on_tick(game, tick: int, issue):
+    state = {}
+
+    def updating(stepping):
+        if not stepping:
+            return
+        units = sorted(o.Id for o in game.world.query(has=("Move",)))
+        if game.tick() == tick:
+            state["unit"] = units[0]
+            issue(game.commands, units[0])
+        elif game.tick() == tick + 1:
+            state["orders"] = game.commands.orders_view(state["unit"])
+
+    play(game, updating)
+    return [order[:3] for order in state["orders"]]
+
+
+def test_replace_after_enqueue_drops_buffered_orders():
+    def issue(commands, unit):
+        commands.order(unit, position_order(OrderType.Run, 10))
+        commands.order(unit, position_order(OrderType.Fight, 11, enqueue=True))
+        commands.order(unit, position_order(OrderType.Run, 12))
+
+    orders = issue_on_tick(synthetic_game(ticks=5), 2, issue)
+    assert orders == [(INVALID, 12, OrderType.Run)]
+
+
+def test_enqueued_orders_follow_the_replace_in_order():
+    def issue(commands, unit):
+        commands.order(unit, position_order(OrderType.Run, 10))
+        commands.order(unit, position_order(OrderType.Fight, 11, enqueue=True))
+        commands.order(unit, position_order(OrderType.Run, 12, enqueue=True))
+
+    orders = issue_on_tick(synthetic_game(ticks=5), 2, issue)
+    assert orders == [
+        (INVALID, 10, OrderType.Run),
+        (INVALID, 11, OrderType.Fight),
+        (INVALID, 12, OrderType.Run),
+    ]
+
+
+def test_repeated_order_is_suppressed_without_extra_queries():
+    game = synthetic_game(ticks=7, game_options={"profile": uw.Profiler()})
+    state = {}
+
+    def updating(stepping):
+        if not stepping:
+            return
+        commands = game.commands
+        unit = min(o.Id for o in game.world.query(has=("Move",)))
+        if game.tick() == 2:
+            commands.order(unit, position_order(OrderType.Run, 10))
+        elif game.tick() == 3:
+            commands.orders_view(unit)
+            state["queries"] = game.profiler().calls_total()["uwOrders"]
+            commands.order(unit, position_order(OrderType.Run, 10))
+        elif game.tick() == 4:
+            commands.order(unit, position_order(OrderType.Run, 10))
+        elif game.tick() == 5:
+            state["stats"] = commands.stats()
+
+    play(game, updating)
+    assert state["stats"]["suppressed"] == 1
+    assert state["stats"]["sent"] == 2
+    assert game.profiler().calls_total()["uwOrders"] == state["queries"]
+
+
+def test_commands_outside_updates_are_sent_immediately():
+    game = synthetic_game(ticks=3)
+    play(game)
+    unit = min(o.Id for o in game.world.query(has=("Move",)))
+    game.commands.order(unit, position_order(OrderType.Run, 10))
+    assert game.commands.pending() == 0
+    assert game.commands.orders_view(unit)[0][:3] == (INVALID, 10, OrderType.Run)
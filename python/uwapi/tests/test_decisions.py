@@ -0,0 +1,18 @@
+import pytest
+
+import uw
+
+
+@pytest.mark.parametrize(
+    "read",
+    [
+        lambda q: q.orders(1),
+        lambda q: q.orders_view(1),
+        lambda q: q.orders_of([1, 2]),
+        lambda q: q.has_orders(1),
+        lambda q: q.idle([1, 2]),
+    ],
+)
+def test_queued_commands_cannot_read_orders(read):
+    with pytest.raises(RuntimeError):
+        read(uw.CommandQueue())
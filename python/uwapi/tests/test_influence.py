@@ -0,0 +1,37 @@
+import numpy as np
+
+import uw
+
+from . import play
+from . import synthetic_game
+
+
+STATIC = ("own", "enemy", "resources")
+
+
+def test_incremental_layers_match_refresh():
+    game = synthetic_game(
+        tiles=4000, entities=600, ticks=31, modified=0.2, churn=0.05, policy_changes=0.2
+    )
+    influence = uw.InfluenceMap(game)
+    checked = []
+
+    def updating(stepping: bool):
+        if not stepping or game.tick() % 10 != 0:
+            return
+        incremental = {name: influence.layer(name).copy() for name in STATIC}
+        influence.refresh()
+        for name in STATIC:
+            assert np.allclose(incremental[name], influence.layer(name), atol=1e-3)
+        checked.append(incremental)
+
+    play(game, updating)
+    assert len(checked) >= 3
+    assert all(np.abs(checked[-1][name]).sum() > 0 for name in STATIC)
+
+    # sources kept up to date by the callbacks match those read from scratch
+    fresh = uw.InfluenceMap(game)
+    influence.refresh()
+    fresh.refresh()
+    for name in STATIC:
+        assert np.allclose(influence.layer(name), fresh.layer(name), atol=1e-3)
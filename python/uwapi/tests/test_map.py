@@ -0,0 +1,31 @@
+import numpy as np
+
+import uw
+
+from . import play
+
+
+# neighbors of every tile written to the same scratch memory
+class ScratchNeighborsBackend(uw.SyntheticBackend):
+    def uwTile(self, index: int, data):
+        super().uwTile(index, data)
+        if not hasattr(self, "_scratch"):
+            self._scratch = self._ffi.new("uint32[]", 4)
+        self._ffi.memmove(self._scratch, data.neighborsIndices, 4 * 4)
+        data.neighborsIndices = self._scratch
+
+
+def test_neighbors_are_copied_per_tile():
+    backend = ScratchNeighborsBackend(tiles=400, entities=10, ticks=2)
+    game = uw.Game(backend=backend)
+    play(game)
+    reference = uw.SyntheticBackend(tiles=400, entities=10, ticks=2)
+    reference.open(game._ffi)
+    expected = []
+    tile = game._ffi.new("struct UwTile *")
+    for i in range(400):
+        reference.uwTile(i, tile)
+        expected.append(game._ffi.unpack(tile.neighborsIndices, tile.neighborsCount))
+    offsets, _ = game.map.neighbors_csr()
+    assert np.array_equal(offsets, np.arange(401) * 4)
+    assert game.map.neighbors() == expected
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import uw
+
+from . import play
+from . import synthetic_game
+
+
+@pytest.fixture(scope="module")
+def game():
+    game = synthetic_game(tiles=10000, entities=10, ticks=2)
+    play(game)
+    return game
+
+
+def fresh(game, blocked: np.ndarray) -> uw.Pathfinder:
+    offsets, indices = game.map.neighbors_csr()
+    pathfinder = uw.Pathfinder(game.map.positions_array(), offsets, indices)
+    pathfinder.set_blocked(np.flatnonzero(blocked))
+    return pathfinder
+
+
+@pytest.mark.parametrize("hops", [False, True])
+def test_blocking_matches_fresh_recompute(game, hops):
+    rng = np.random.default_rng(0)
+    offsets, indices = game.map.neighbors_csr()
+    pathfinder = uw.Pathfinder(game.map.positions_array(), offsets, indices)
+    count = pathfinder.tiles_count()
+    sources = [[0], [4321], [17, 9000, 5555]]
+    for s in sources:
+        pathfinder.distance_field(s, hops)
+    for step in range(30):
+        # small batches are updated incrementally, not recomputed
+        tiles = rng.choice(count, size=rng.integers(1, 6), replace=False)
+        blocked = step % 3 != 2
+        if not blocked:
+            tiles = rng.choice(np.flatnonzero(pathfinder.blocked()), size=3)
+        pathfinder.set_blocked(tiles.tolist(), blocked)
+        reference = fresh(game, pathfinder.blocked())
+        for s in sources:
+            expected = reference.distance_field(s, hops)
+            field = pathfinder.distance_field(s, hops)
+            assert np.array_equal(np.isinf(field), np.isinf(expected))
+            assert np.allclose(field, expected, rtol=1e-5)
+    assert pathfinder.blocked().sum() > 0
+    assert pathfinder.cached_fields() == len(sources)
+
+
+def test_path_length_matches_distance_field(game):
+    pathfinder = fresh(game, np.zeros(10000, dtype=bool))
+    pathfinder.set_blocked(range(5000, 5090))
+    positions = game.map.positions_array()
+    field = pathfinder.distance_field([12])
+    for goal in (9000, 5200, 77):
+        path = pathfinder.path(12, goal)
+        assert path[0] == 12 and path[-1] == goal
+        assert not pathfinder.blocked()[path].any()
+        length = np.linalg.norm(np.diff(positions[path], axis=0), axis=-1).sum()
+        assert length == pytest.approx(field[goal], rel=1e-4)
@@ -0,0 +1,92 @@
+import pytest
+
+import uw
+
+from . import play
+
+
+# the native library fires the log callback from within uwLog
+class LoggingBackend(uw.SyntheticBackend):
+    def uwLog(self, severity: int, message):
+        data = self._ffi.new("UwLogCallback *")
+        text = self._ffi.new("char[]", message)
+        component = self._ffi.new("char[]", b"synthetic")
+        data.message = text
+        data.component = component
+        data.severity = severity
+        self._fire("uwSetLogCallback", data)
+
+
+def session(backend: uw.Backend, record: str = "", game_options: dict = None):
+    game = uw.Game(backend=backend, record=record, **(game_options or {}))
+    ticks = []
+
+    def updating(stepping: bool):
+        positions = sorted(
+            (o.Id, int(o.Position.position))
+            for o in game.world.entities().values()
+            if hasattr(o, "Position")
+        )
+        enemies = sorted(o.Id for o in game.world.query(policy=uw.Policy.Enemy))
+        ticks.append((game.tick(), stepping, positions, enemies))
+
+    play(game, updating)
+    result = {
+        "ticks": ticks,
+        "tiles": game.map.tiles_count(),
+        "positions": float(game.map.positions_array().sum()),
+        "neighbors": game.map.neighbors_csr()[1].tolist(),
+        "overview": game.map.overview_array().tolist(),
+        "prototypes": {p: game.prototypes.json(p) for p in game.prototypes.all()},
+        "definitions": (
+            game.prototypes.hit_chances_table(),
+            game.prototypes.terrain_types_table(),
+        ),
+    }
+    game.close()
+    return result
+
+
+@pytest.mark.parametrize("backend", [uw.SyntheticBackend, LoggingBackend])
+@pytest.mark.parametrize("name", ["match.uwlog", "match.uwlog.gz"])
+def test_replay_matches_recording(tmp_path, backend, name):
+    path = str(tmp_path / name)
+    recorded = session(backend(tiles=400, entities=100, ticks=20), record=path)
+    replayed = session(uw.Replay(path))
+    assert recorded["tiles"] == 400
+    assert recorded["prototypes"]
+    assert recorded["definitions"] != (None, None)
+    assert replayed == recorded
+
+
+def test_replay_stops_at_a_cut_off_frame(tmp_path):
+    path = tmp_path / "match.uwlog"
+    recorded = session(LoggingBackend(tiles=400, entities=100, ticks=20), str(path))
+    path.write_bytes(path.read_bytes()[:-3])
+    replayed = session(uw.Replay(str(path)))
+    assert replayed["tiles"] == recorded["tiles"]
+    assert replayed["ticks"][:-1] == recorded["ticks"][:-1]
+
+
+def test_replay_answers_from_the_current_callback(tmp_path):
+    path = str(tmp_path / "match.uwlog")
+    session(uw.SyntheticBackend(tiles=400, entities=100, ticks=20), record=path)
+    keys = {(f[1], f[2]) for f in uw.read_frames(path) if f[0] == "c"}
+    replay = uw.Replay(path)
+    session(replay)
+    assert 0 < len(replay._state) < len(keys) // 4
+
+
+def test_recorder_forgets_pointers_of_removed_entities(tmp_path):
+    backend = uw.SyntheticBackend(tiles=400, entities=100, ticks=20, churn=0.2)
+    game = uw.Game(backend=backend, record=str(tmp_path / "match.uwlog"))
+    recorder = game._api
+    stale = []
+
+    def updating(stepping: bool):
+        alive = set(game.world.entities().keys())
+        stale.extend(i for i in recorder._pointers.values() if i not in alive)
+
+    play(game, updating)
+    game.close()
+    assert not stale
@@ -0,0 +1,51 @@
+import time
+
+import uw
+
+from . import play
+from . import synthetic_game
+
+
+def test_offsets_stagger_tasks_of_the_same_period():
+    game = synthetic_game(ticks=25)
+    scheduler = uw.Scheduler(game, budget_ms=1000)
+    ran = {"combat": [], "build": []}
+    scheduler.add_task("combat", lambda: ran["combat"].append(game.tick()), period=10)
+    scheduler.add_task(
+        "build", lambda: ran["build"].append(game.tick()), period=10, offset=4
+    )
+    play(game)
+    assert ran["combat"] and ran["build"]
+    assert not set(ran["combat"]) & set(ran["build"])
+    assert all(b - c == 4 for c, b in zip(ran["combat"], ran["build"]))
+
+
+def test_offsets_hold_when_stepping_starts_late():
+    game = synthetic_game()
+    scheduler = uw.Scheduler(game, budget_ms=1000)
+    current = []
+    ran = {"combat": [], "build": []}
+    scheduler.add_task("combat", lambda: ran["combat"].append(current[-1]), period=10)
+    scheduler.add_task(
+        "build", lambda: ran["build"].append(current[-1]), period=10, offset=4
+    )
+    # registered at tick 0, stepping from tick 500
+    for tick in range(500, 560):
+        current.append(tick)
+        scheduler.run(tick)
+    assert ran["combat"] == list(range(500, 560, 10))
+    assert ran["build"] == list(range(504, 560, 10))
+
+
+def test_generator_cost_sums_its_slices():
+    def work():
+        for _ in range(4):
+            time.sleep(0.002)
+            yield
+
+    game = synthetic_game(ticks=12)
+    scheduler = uw.Scheduler(game, budget_ms=1, smoothing=1.0)
+    task = scheduler.add_task("work", work, period=100)
+    play(game)
+    assert task.runs == 1
+    assert task.cost_ms >= 8
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import uw
+
+from . import play
+from . import synthetic_game
+
+
+FILTERS = [{}, {"policy": uw.Policy.Enemy, "has": ("Unit",)}, {"has": ("Move",)}]
+
+
+def brute_force(game, tile: int, **filters) -> np.ndarray:
+    positions = game.map.positions_array()
+    entities = game.world.entities().values()
+    if filters:
+        entities = game.world.query(**filters)
+    tiles = [int(o.Position.position) for o in entities if hasattr(o, "Position")]
+    return np.sort(np.linalg.norm(positions[tiles] - positions[tile], axis=-1))
+
+
+def distances(game, tile: int, entities: list) -> np.ndarray:
+    positions = game.map.positions_array()
+    tiles = [int(o.Position.position) for o in entities]
+    return np.linalg.norm(positions[tiles] - positions[tile], axis=-1)
+
+
+@pytest.mark.parametrize("cell_size", [None, 5.0, 70.0])
+def test_queries_match_brute_force(cell_size):
+    game = synthetic_game(tiles=10000, entities=2000, ticks=6, churn=0.05)
+    index = uw.SpatialIndex(game, cell_size=cell_size)
+    rng = np.random.default_rng(0)
+    checked = []
+
+    def updating(stepping: bool):
+        if not stepping:
+            return
+        sources = rng.integers(0, game.map.tiles_count(), size=5).tolist()
+        for filters in FILTERS:
+            for tile in sources:
+                expected = brute_force(game, tile, **filters)
+                for k in (1, 10, 100):
+                    found = index.k_nearest(tile, k, **filters)
+                    assert len(found) == min(k, len(expected))
+                    assert np.allclose(distances(game, tile, found), expected[:k])
+                found = index.within_radius(tile, 40.0, **filters)
+                inside = expected[expected <= 40.0]
+                assert np.allclose(distances(game, tile, found), inside)
+            many = index.k_nearest_many(sources, 10, **filters)
+            for tile, found in zip(sources, many):
+                expected = brute_force(game, tile, **filters)[:10]
+                assert np.allclose(distances(game, tile, found), expected)
+        checked.append(game.tick())
+
+    play(game, updating)
+    assert len(checked) >= 5
@@ -0,0 +1,12 @@
+from . import play
+from . import synthetic_game
+
+
+def test_player_name_is_stored_as_characters():
+    game = synthetic_game(ticks=2)
+    play(game)
+    players = [o for o in game.world.entities().values() if hasattr(o, "Player")]
+    assert players
+    for o in players:
+        name = game._ffi.string(o.Player.name, o.Player.nameLength)
+        assert name == b"synthetic"
@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+import uw
+
+from . import play
+from . import synthetic_game
+
+
+MODES = [{}, {"columnar": True}, {"lazy": True}]
+
+QUERIES = [
+    {},
+    {"own": True},
+    {"own": False, "has": ("Unit",)},
+    {"policy": uw.Policy.Enemy, "has": ("Unit",)},
+    {"proto_type": uw.Prototype.Unit},
+    {"proto_name": "tank", "has": ("Move", "Life")},
+    {"proto": 7},
+]
+
+
+def fresh_query(
+    game,
+    own=None,
+    policy=None,
+    has=(),
+    proto_type=None,
+    proto_name=None,
+    proto=None,
+):
+    prototypes = game.prototypes
+    result = set()
+    for o in game.world.entities().values():
+        if own is not None and o.own() != own:
+            continue
+        if policy is not None and o.policy() != policy:
+            continue
+        if proto_type is not None or proto_name is not None or proto is not None:
+            if not o.has("Proto"):
+                continue
+            p = int(o.Proto.proto)
+            if proto is not None and p != proto:
+                continue
+            if proto_type is not None and prototypes.type(p) != proto_type:
+                continue
+            if proto_name is not None and prototypes.name(p) != proto_name:
+                continue
+        if all(o.has(c) for c in has):
+            result.add(o.Id)
+    return result
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_cached_queries_match_fresh_recompute(mode):
+    game = synthetic_game(mode, churn=0.02, policy_changes=0.1)
+    checked = []
+
+    def updating(stepping):
+        if not stepping:
+            return
+        for filters in QUERIES:
+            cached = game.world.query(**filters)
+            assert {o.Id for o in cached} == fresh_query(game, **filters), filters
+            assert game.world.count(**filters) == len(cached)
+        checked.append(game.tick())
+
+    play(game, updating)
+    assert len(checked) == 30
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_indexes_match_fresh_recompute(mode):
+    game = synthetic_game(mode, churn=0.02)
+
+    def updating(stepping):
+        world = game.world
+        entities = world.entities().values()
+        for force in {int(o.Owner.force) for o in entities if o.has("Owner")}:
+            expected = {
+                o.Id for o in entities if o.has("Owner") and o.Owner.force == force
+            }
+            assert {o.Id for o in world.by_force(force)} == expected
+        for proto in {int(o.Proto.proto) for o in entities if o.has("Proto")}:
+            expected = {
+                o.Id for o in entities if o.has("Proto") and o.Proto.proto == proto
+            }
+            assert {o.Id for o in world.by_proto(proto)} == expected
+        positioned = [o for o in entities if o.has("Position")]
+        for o in positioned[:50]:
+            assert o in world.at_tile(o.Position.position)
+        snapshot = world.snapshot()
+        assert sorted(snapshot.ids.tolist()) == sorted(world.entities())
+
+    play(game, updating)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_removed_entities_keep_last_components(mode):
+    game = synthetic_game(mode, churn=0.05)
+    removed = []
+
+    def entity_removed(o):
+        if o.has("Position"):
+            removed.append((o, int(o.Position.position), int(o.Proto.proto)))
+
+    def updating(stepping):
+        for o, position, proto in removed:
+            assert o.Position.position == position
+            assert o.Proto.proto == proto
+
+    game.world.add_entity_removed_callback(entity_removed)
+    play(game, updating)
+    assert removed
+
+
+def test_store_records_survive_growth():
+    store = uw.ComponentStore(uw.load_ffi(), ["Position"], capacity=16)
+    store.assign(1)
+    store.set_present(store.slot(1), "Position", True)
+    store.column("Position").position[store.slot(1)] = 5
+    record = store.get(1, "Position")
+    store.column("Position").position[store.slot(1)] = 7
+    assert record.position == 5
+    for _id in range(2, 100):
+        store.assign(_id)
+    store.column("Position").position[store.slot(1)] = 6
+    assert record.position == 5
+    assert store.get(1, "Position").position == 6
+    assert np.array_equal(store.ids()[:3], [1, 2, 3])
@@ -1,6 +1,19 @@
+from .aio import *
+from .backend import *
 from .commands import *
+from .decisions import *
 from .game import *
 from .helpers import *
+from .influence import *
 from .map import *
+from .map_cache import *
+from .pathfinding import *
+from .profiler import *
 from .prototypes import *
+from .replay import *
+from .scheduler import *
+from .snapshot import *
+from .spatial import *
+from .store import *
+from .synthetic import *
 from .world import *
@@ -0,0 +1,58 @@
+import os
+import sys
+
+from cffi import FFI
+
+# Builds the bindings out of line so that Game does not parse bots.h at every
+# start. uw._bots is an ABI module and needs no compiler. With UW_BUILD_API=1
+# and UNNATURAL_ROOT pointing at the game's bin directory, uw._bots_api is
+# additionally compiled against the hardened library for cheaper native calls.
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+HEADER = os.path.join(_DIR, "bots.h")
+
+
+def _cdef() -> str:
+    with open(HEADER, "r") as f:
+        return f.read()
+
+
+def _abi_builder() -> FFI:
+    builder = FFI()
+    builder.cdef(_cdef())
+    builder.set_source("uw._bots", None)
+    return builder
+
+
+def _api_builder() -> FFI:
+    root = os.path.expanduser(os.environ["UNNATURAL_ROOT"])
+    library = "unnatural-uwapi-hard"
+    builder = FFI()
+    builder.cdef(_cdef())
+    builder.set_source(
+        "uw._bots_api",
+        '#include "bots.h"',
+        include_dirs=[os.path.join(_DIR, "..", "..", "..", "c", "uwapi", "uwapi")],
+        libraries=[library],
+        library_dirs=[root],
+        runtime_library_dirs=[root] if sys.platform != "win32" else [],
+    )
+    return builder
+
+
+def build_api() -> bool:
+    return os.environ.get("UW_BUILD_API") == "1" and bool(
+        os.environ.get("UNNATURAL_ROOT")
+    )
+
+
+# a checkout has no header before make header
+ffibuilder = _abi_builder() if os.path.exists(HEADER) else None
+api_builder = _api_builder() if ffibuilder is not None and build_api() else None
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(_DIR, ".."))
+    for builder in (ffibuilder, api_builder):
+        if builder is not None:
+            builder.compile(verbose=True)
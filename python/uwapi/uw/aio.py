@@ -0,0 +1,225 @@
+import asyncio
+
+from typing import Any
+from typing import AsyncIterator
+from typing import Optional
+
+from .decisions import _issue_queued
+from .decisions import CommandQueue
+from .helpers import GameState
+from .helpers import MapState
+from .helpers import ShootingData
+from .snapshot import Snapshot
+
+
+# Game callbacks arrive on the thread running the connect call; every event
+# is handed to the event loop with call_soon_threadsafe, so coroutines never
+# run inside a native callback. Entities keep changing on that thread, use
+# next_snapshot() for a consistent view. Coroutines issue commands through
+# self.commands, which the next update callback sends.
+class AsyncGame:
+    def __init__(self, game):
+        self.game = game
+        self.commands = CommandQueue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._tick: int = 0
+        self._map_state: MapState = MapState.NONE
+        self._game_state: GameState = GameState.NONE
+        self._tick_waiters: list[asyncio.Future] = []
+        self._snapshot_waiters: list[asyncio.Future] = []
+        self._map_waiters: list[asyncio.Future] = []
+        self._state_waiters: list[tuple[GameState, asyncio.Future]] = []
+        self._shooting_queues: list[asyncio.Queue] = []
+        self._entity_queues: list[asyncio.Queue] = []
+
+        # written on the callback thread, published once per tick
+        self._wants_snapshot: bool = False
+        self._entity_events: list[tuple[str, Any]] = []
+
+        self.game.add_map_state_callback(self._map_state_changed)
+        self.game.add_game_state_callback(self._game_state_changed)
+        self.game.add_update_callback(self._updating)
+        self.game.add_shooting_callback(self._shooting)
+        self.game.world.add_entity_added_callback(self._entity_added)
+        self.game.world.add_entity_changed_callback(self._entity_changed)
+        self.game.world.add_entity_removed_callback(self._entity_removed)
+
+    def tick(self) -> int:
+        return self._tick
+
+    def _future(self) -> asyncio.Future:
+        self._loop = asyncio.get_running_loop()
+        return self._loop.create_future()
+
+    async def next_tick(self) -> int:
+        fut = self._future()
+        self._tick_waiters.append(fut)
+        return await fut
+
+    async def next_snapshot(self) -> Snapshot:
+        fut = self._future()
+        self._snapshot_waiters.append(fut)
+        self._wants_snapshot = True
+        return await fut
+
+    async def map_loaded(self):
+        if self._map_state == MapState.Loaded:
+            return
+        fut = self._future()
+        self._map_waiters.append(fut)
+        await fut
+
+    async def game_state(self, state: GameState):
+        if self._game_state == state:
+            return
+        fut = self._future()
+        self._state_waiters.append((state, fut))
+        await fut
+
+    async def _events(self, queues: list) -> AsyncIterator:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        queues.append(queue)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                yield item
+        finally:
+            queues.remove(queue)
+
+    def shooting(self) -> AsyncIterator[list[ShootingData]]:
+        return self._events(self._shooting_queues)
+
+    # yields ("added" | "changed" | "removed", entity)
+    def entity_changes(self) -> AsyncIterator[tuple[str, Any]]:
+        return self._events(self._entity_queues)
+
+    async def _connect(self, function, *args):
+        self._loop = asyncio.get_running_loop()
+        try:
+            return await self._loop.run_in_executor(None, function, *args)
+        finally:
+            self._disconnected()
+
+    async def connect_find_lan(self, timeout_us: int = 1000000) -> bool:
+        return await self._connect(self.game.connect_find_lan, timeout_us)
+
+    async def connect_direct(self, address: str, port: int):
+        await self._connect(self.game.connect_direct, address, port)
+
+    async def connect_lobby_id(self, lobby_id: int):
+        await self._connect(self.game.connect_lobby_id, lobby_id)
+
+    async def connect_new_server(
+        self, visibility: int = 0, name: str = "", extra_params: str = ""
+    ):
+        await self._connect(
+            self.game.connect_new_server, visibility, name, extra_params
+        )
+
+    async def try_reconnect(self) -> bool:
+        return await self._connect(self.game.try_reconnect)
+
+    def _post(self, callback, *args):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(callback, *args)
+
+    @staticmethod
+    def _resolve(waiters: list[asyncio.Future], result=None):
+        for fut in waiters:
+            if not fut.done():
+                fut.set_result(result)
+        waiters.clear()
+
+    def _disconnected(self):
+        error = ConnectionError("the game connection ended")
+        waiters = self._tick_waiters + self._snapshot_waiters + self._map_waiters
+        waiters += [fut for _, fut in self._state_waiters]
+        for fut in waiters:
+            if not fut.done():
+                fut.set_exception(error)
+        self._tick_waiters.clear()
+        self._snapshot_waiters.clear()
+        self._map_waiters.clear()
+        self._state_waiters.clear()
+        for queue in self._shooting_queues + self._entity_queues:
+            queue.put_nowait(None)
+
+    # callback thread
+
+    def _map_state_changed(self, state: MapState):
+        self._post(self._map_state_arrived, state)
+
+    def _game_state_changed(self, state: GameState):
+        self._post(self._game_state_arrived, state)
+
+    def _issue_commands(self):
+        queued = self.commands.queued()
+        count = len(queued)
+        if count == 0:
+            return
+        # coroutines append meanwhile, only the commands seen here are taken
+        commands = queued[:count]
+        del queued[:count]
+        _issue_queued(self.game, commands)
+
+    def _updating(self, stepping: bool):
+        self._issue_commands()
+        snapshot = None
+        if self._wants_snapshot:
+            self._wants_snapshot = False
+            snapshot = self.game.world.snapshot()
+        events, self._entity_events = self._entity_events, []
+        if stepping or snapshot is not None or events:
+            self._post(self._tick_arrived, self.game.tick(), stepping, snapshot, events)
+
+    def _shooting(self, data: list[ShootingData]):
+        if self._shooting_queues:
+            self._post(self._broadcast, self._shooting_queues, data)
+
+    def _entity_added(self, entity):
+        if self._entity_queues:
+            self._entity_events.append(("added", entity))
+
+    def _entity_changed(self, entity):
+        if self._entity_queues:
+            self._entity_events.append(("changed", entity))
+
+    def _entity_removed(self, entity):
+        if self._entity_queues:
+            self._entity_events.append(("removed", entity))
+
+    # event loop
+
+    def _map_state_arrived(self, state: MapState):
+        self._map_state = state
+        if state == MapState.Loaded:
+            self._resolve(self._map_waiters)
+
+    def _game_state_arrived(self, state: GameState):
+        self._game_state = state
+        waiting = []
+        for expected, fut in self._state_waiters:
+            if expected == state:
+                self._resolve([fut])
+            else:
+                waiting.append((expected, fut))
+        self._state_waiters = waiting
+
+    def _tick_arrived(self, tick: int, stepping: bool, snapshot, events: list):
+        self._tick = tick
+        for event in events:
+            self._broadcast(self._entity_queues, event)
+        if snapshot is not None:
+            self._resolve(self._snapshot_waiters, snapshot)
+        if stepping:
+            self._resolve(self._tick_waiters, tick)
+
+    @staticmethod
+    def _broadcast(queues: list[asyncio.Queue], item):
+        for queue in queues:
+            queue.put_nowait(item)
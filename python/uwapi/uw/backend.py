@@ -0,0 +1,108 @@
+from typing import Any
+from typing import Optional
+
+
+_CALLBACK_SETTERS = (
+    "uwSetExceptionCallback",
+    "uwSetLogCallback",
+    "uwSetConnectionStateCallback",
+    "uwSetGameStateCallback",
+    "uwSetMapStateCallback",
+    "uwSetUpdateCallback",
+    "uwSetShootingCallback",
+)
+
+
+def _count_field(struct_type, field: str) -> Optional[str]:
+    names = [name for name, _ in struct_type.fields]
+    if "count" in names:
+        return "count"
+    if field.endswith("Indices") and field[: -len("Indices")] + "Count" in names:
+        return field[: -len("Indices")] + "Count"
+    return None
+
+
+# pointer fields are either strings or arrays sized by a sibling count field
+def dump_struct(ffi, ptr) -> tuple[bytes, dict[str, Optional[bytes]]]:
+    struct_type = ffi.typeof(ptr).item
+    raw = ffi.buffer(ptr)[:]
+    pointed = {}
+    for name, field in struct_type.fields:
+        if field.type.kind != "pointer":
+            continue
+        value = getattr(ptr, name)
+        if value == ffi.NULL:
+            pointed[name] = None
+        elif field.type.item.cname == "char":
+            pointed[name] = ffi.string(value)
+        else:
+            count = getattr(ptr, _count_field(struct_type, name))
+            pointed[name] = ffi.buffer(value, count * ffi.sizeof(field.type.item))[:]
+    return raw, pointed
+
+
+# the memory behind restored pointers is appended to keep
+def load_struct(ffi, ptr, raw: bytes, pointed: dict[str, Optional[bytes]], keep: list):
+    ffi.memmove(ptr, raw, len(raw))
+    struct_type = ffi.typeof(ptr).item
+    for name, field in struct_type.fields:
+        if name not in pointed:
+            continue
+        data = pointed[name]
+        if data is None:
+            setattr(ptr, name, ffi.NULL)
+            continue
+        buf = ffi.new("char[]", data if field.type.item.cname == "char" else len(data))
+        if field.type.item.cname != "char":
+            ffi.memmove(buf, data, len(data))
+        keep.append(buf)
+        setattr(ptr, name, ffi.cast(field.type, buf))
+
+
+# in-process replacement for the native library, see Game(backend=...)
+class Backend:
+    UW_VERSION = 21  # must match bots.h
+
+    def __init__(self):
+        self._ffi = None
+        self._callbacks: dict[str, Any] = {}
+        self._keep: list = []
+
+    def open(self, ffi):
+        self._ffi = ffi
+        return self
+
+    def _fire(self, setter: str, *args):
+        cb = self._callbacks.get(setter)
+        if cb is not None:
+            cb(*args)
+
+    def _set_array(self, data, field: str, item: str, values, count_field="count"):
+        arr = self._ffi.new(f"{item}[]", values)
+        self._keep.append(arr)
+        setattr(data, field, arr)
+        setattr(data, count_field, len(arr))
+
+    def _set_ids(self, data, ids):
+        self._set_array(data, "ids", "uint32", ids)
+
+    def uwInitialize(self, version: int):
+        pass
+
+    def uwEntityPointer(self, _id: int):
+        return self._ffi.cast("UwEntity *", _id + 1)
+
+    def uwEntityId(self, e) -> int:
+        return int(self._ffi.cast("uintptr_t", e)) - 1
+
+    def uwDeinitialize(self):
+        pass
+
+    def __getattr__(self, name: str):
+        if name in _CALLBACK_SETTERS:
+
+            def setter(callback):
+                self._callbacks[name] = callback
+
+            return setter
+        raise AttributeError(name)
@@ -1,3 +1,5 @@
+from typing import Iterable
+
 from .helpers import Order
 from .helpers import OrderType
 from .helpers import OrderPriority
@@ -8,16 +10,83 @@ from .helpers import _unpack_list
 class Commands:
     invalid = 4294967295
 
-    def __init__(self, api, ffi):
+    def __init__(self, api, ffi, game=None):
         self._api = api
         self._ffi = ffi
+        self._game = game
+
+        # commands issued during an update callback are buffered and sent
+        # once at its end, the last one per unit and kind wins
+        self._buffering: bool = False
+        self._pending: dict[tuple, tuple] = {}
+        self._sent: int = 0
+        self._coalesced: int = 0
+        self._suppressed: int = 0
+
+        # (entity, position, order type, priority) per unit, valid for one tick
+        self._orders_data = ffi.new("struct UwOrders *") if ffi is not None else None
+        self._orders_cache: dict[int, tuple[tuple[int, int, int, int], ...]] = {}
+        self._orders_tick: int = -1
 
     def orders(self, unit: int) -> list[Order]:
-        os = self._ffi.new("struct UwOrders *")
-        self._api.uwOrders(unit, os)
-        return [Order.from_c(o) for o in _unpack_list(self._ffi, os, "orders")]
+        return [
+            Order(entity, position, OrderType(order), OrderPriority(priority))
+            for entity, position, order, priority in self.orders_view(unit)
+        ]
+
+    def orders_view(self, unit: int) -> tuple[tuple[int, int, int, int], ...]:
+        if self._game is None:
+            return self._fetch_orders(unit)
+        tick = self._game.tick()
+        if self._orders_tick != tick:
+            self._orders_cache.clear()
+            self._orders_tick = tick
+        orders = self._orders_cache.get(unit)
+        if orders is None:
+            orders = self._orders_cache[unit] = self._fetch_orders(unit)
+        return orders
+
+    def orders_of(
+        self, units: Iterable[int]
+    ) -> dict[int, tuple[tuple[int, int, int, int], ...]]:
+        return {unit: self.orders_view(unit) for unit in units}
+
+    def has_orders(self, unit: int) -> bool:
+        return len(self.orders_view(unit)) > 0
+
+    def idle(self, units: Iterable[int]) -> list[int]:
+        return [unit for unit in units if not self.orders_view(unit)]
+
+    def _fetch_orders(self, unit: int) -> tuple[tuple[int, int, int, int], ...]:
+        data = self._orders_data
+        self._api.uwOrders(unit, data)
+        return tuple(
+            (o.entity, o.position, o.order, o.priority)
+            for o in _unpack_list(self._ffi, data, "orders")
+        )
 
     def order(self, unit: int, order: Order):
+        if not self._buffering:
+            self._send_order(unit, order)
+            self._sent += 1
+            return
+        # one list per unit, so a replacing order drops the ones buffered before
+        key = ("order", unit)
+        pending = self._pending.get(key)
+        if pending is not None and order.priority & OrderPriority.Enqueue:
+            pending[1][1].append(order)
+            return
+        if pending is not None:
+            self._coalesced += len(pending[1][1])
+            del self._pending[key]
+        self._pending[key] = (self._send_orders, (unit, [order]))
+
+    def _send_orders(self, unit: int, orders: list[Order]):
+        for order in orders:
+            self._send_order(unit, order)
+
+    def _send_order(self, unit: int, order: Order):
+        self._orders_cache.pop(unit, None)
         o = self._ffi.new("struct UwOrder *")
         o.entity = order.entity
         o.position = order.position
@@ -49,28 +118,111 @@ class Commands:
                      priority=OrderPriority.User)
 
     def command_self_destruct(self, unit: int):
-        self._api.uwCommandSelfDestruct(unit)
+        self._submit(
+            ("self_destruct", unit), self._api.uwCommandSelfDestruct, (unit,)
+        )
 
     def command_place_construction(self, proto: int, position: int, yaw: float = 0):
-        self._api.uwCommandPlaceConstruction(proto, position, yaw)
+        self._submit(
+            ("place_construction", proto, position),
+            self._api.uwCommandPlaceConstruction,
+            (proto, position, yaw),
+        )
 
     def command_set_recipe(self, unit: int, recipe: int):
-        self._api.uwCommandSetRecipe(unit, recipe)
+        self._submit(
+            ("set_recipe", unit), self._api.uwCommandSetRecipe, (unit, recipe)
+        )
 
     def command_set_priority(self, unit: int, priority: Priority):
-        self._api.uwCommandSetPriority(unit, priority)
+        self._submit(
+            ("set_priority", unit), self._api.uwCommandSetPriority, (unit, priority)
+        )
 
     def command_load(self, unit: int, resource_type: int):
-        self._api.uwCommandLoad(unit, resource_type)
+        self._submit(("load", unit), self._api.uwCommandLoad, (unit, resource_type))
 
     def command_unload(self, unit: int):
-        self._api.uwCommandUnload(unit)
+        self._submit(("unload", unit), self._api.uwCommandUnload, (unit,))
 
     def command_move(self, unit: int, position: int, yaw: float = 0):
-        self._api.uwCommandMove(unit, position, yaw)
+        self._submit(
+            ("move", unit), self._api.uwCommandMove, (unit, position, yaw)
+        )
 
     def command_aim(self, unit: int, target: int):
-        self._api.uwCommandAim(unit, target)
+        self._submit(("aim", unit), self._api.uwCommandAim, (unit, target))
 
     def command_renounce_control(self, unit: int):
-        self._api.uwCommandRenounceControl(unit)
+        self._submit(
+            ("renounce_control", unit), self._api.uwCommandRenounceControl, (unit,)
+        )
+
+    def buffering(self) -> bool:
+        return self._buffering
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "sent": self._sent,
+            "coalesced": self._coalesced,
+            "suppressed": self._suppressed,
+        }
+
+    def begin(self):
+        self._buffering = True
+
+    def flush(self):
+        self._buffering = False
+        pending, self._pending = self._pending, {}
+        for key, (function, args) in pending.items():
+            if self._redundant(key[0], args):
+                self._suppressed += 1
+                continue
+            function(*args)
+            self._sent += len(args[1]) if key[0] == "order" else 1
+
+    def _submit(self, key: tuple, function, args: tuple):
+        if not self._buffering:
+            function(*args)
+            self._sent += 1
+            return
+        if key in self._pending:
+            self._coalesced += 1
+        self._pending[key] = (function, args)
+
+    # only checked against queues already read this tick
+    def _same_orders(self, unit: int, orders: list[Order]) -> bool:
+        if len(orders) != 1 or orders[0].priority & OrderPriority.Enqueue:
+            return False
+        if self._orders_tick != self._game.tick():
+            return False
+        current = self._orders_cache.get(unit)
+        order = orders[0]
+        return current is not None and len(current) == 1 and current[0][:3] == (
+            order.entity,
+            order.position,
+            int(order.order_type),
+        )
+
+    # commands whose effect the unit already has
+    def _redundant(self, kind: str, args: tuple) -> bool:
+        if self._game is None or kind == "place_construction":
+            return False
+        if kind == "order":
+            return self._same_orders(*args)
+        entity = self._game.world.entities().get(args[0])
+        if entity is None:
+            return False
+        if kind == "set_recipe":
+            recipe = getattr(entity, "Recipe", None)
+            return recipe is not None and recipe.recipe == args[1]
+        if kind == "aim":
+            aim = getattr(entity, "Aim", None)
+            return aim is not None and aim.target == args[1]
+        if kind == "move":
+            move = getattr(entity, "Move", None)
+            return move is not None and move.posEnd == args[1]
+        return False
@@ -0,0 +1,149 @@
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from typing import Optional
+
+from .commands import Commands
+from .helpers import Order
+from .helpers import Priority
+from .snapshot import Snapshot
+
+
+# records commands issued off the update thread; Game flushes them later
+class CommandQueue(Commands):
+    def __init__(self):
+        super().__init__(None, None)
+        self._queued: list[tuple] = []
+
+    def queued(self) -> list[tuple]:
+        return self._queued
+
+    # orders, orders_of, has_orders and idle all read through here
+    def orders_view(self, unit: int) -> tuple[tuple[int, int, int, int], ...]:
+        raise RuntimeError("orders are not available outside the update callback")
+
+    def order(self, unit: int, order: Order):
+        self._queued.append(("order", unit, order))
+
+    def command_self_destruct(self, unit: int):
+        self._queued.append(("command_self_destruct", unit))
+
+    def command_place_construction(self, proto: int, position: int, yaw: float = 0):
+        self._queued.append(("command_place_construction", proto, position, yaw))
+
+    def command_set_recipe(self, unit: int, recipe: int):
+        self._queued.append(("command_set_recipe", unit, recipe))
+
+    def command_set_priority(self, unit: int, priority: Priority):
+        self._queued.append(("command_set_priority", unit, priority))
+
+    def command_load(self, unit: int, resource_type: int):
+        self._queued.append(("command_load", unit, resource_type))
+
+    def command_unload(self, unit: int):
+        self._queued.append(("command_unload", unit))
+
+    def command_move(self, unit: int, position: int, yaw: float = 0):
+        self._queued.append(("command_move", unit, position, yaw))
+
+    def command_aim(self, unit: int, target: int):
+        self._queued.append(("command_aim", unit, target))
+
+    def command_renounce_control(self, unit: int):
+        self._queued.append(("command_renounce_control", unit))
+
+
+def _decide(strategy: Callable[[Snapshot, CommandQueue], None], snapshot: Snapshot):
+    queue = CommandQueue()
+    strategy(snapshot, queue)
+    return queue.queued()
+
+
+def _entities_of(command: tuple) -> list[int]:
+    name = command[0]
+    if name == "command_place_construction":
+        return []
+    entities = [command[1]]
+    if name == "order" and command[2].entity != Commands.invalid:
+        entities.append(command[2].entity)
+    elif name == "command_aim":
+        entities.append(command[2])
+    return entities
+
+
+# issues commands queued off the update thread, those for entities that died in
+# the meantime are dropped; returns how many were dropped
+def _issue_queued(game, commands: list[tuple]) -> int:
+    entities = game.world.entities()
+    dropped = 0
+    for command in commands:
+        if any(e not in entities for e in _entities_of(command)):
+            dropped += 1
+            continue
+        getattr(game.commands, command[0])(*command[1:])
+    return dropped
+
+
+class DecisionEngine:
+    def __init__(
+        self,
+        game,
+        strategy: Callable[[Snapshot, CommandQueue], None],
+        executor: Optional[Executor] = None,
+    ):
+        self._game = game
+        self._strategy = strategy
+        self._owns_executor: bool = executor is None
+        self._executor: Executor = (
+            executor if executor is not None else ThreadPoolExecutor(max_workers=1)
+        )
+        self._pending: Optional[Future] = None
+        self._snapshot_tick: int = 0
+        self._flushed: int = 0
+        self._dropped: int = 0
+
+        self._game.add_update_callback(self._updating)
+
+    def pending(self) -> bool:
+        return self._pending is not None
+
+    def flushed(self) -> int:
+        return self._flushed
+
+    def dropped(self) -> int:
+        return self._dropped
+
+    def close(self):
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    def _flush(self, commands: list[tuple]):
+        dropped = _issue_queued(self._game, commands)
+        self._dropped += dropped
+        self._flushed += len(commands) - dropped
+
+    def _collect(self):
+        future, self._pending = self._pending, None
+        try:
+            commands = future.result()
+        except Exception as e:
+            self._game.log_error(
+                f"decision from tick {self._snapshot_tick} failed: {e!r}"
+            )
+            return
+        self._flush(commands)
+
+    def _updating(self, stepping: bool):
+        if not stepping:
+            return
+        if self._pending is not None:
+            if not self._pending.done():
+                return
+            self._collect()
+        snapshot = self._game.world.snapshot()
+        self._snapshot_tick = snapshot.tick
+        self._pending = self._executor.submit(_decide, self._strategy, snapshot)
@@ -3,7 +3,9 @@ import sys
 
 from cffi import FFI
 from typing import Callable
+from typing import Optional
 
+from .backend import Backend
 from .commands import Commands
 from .helpers import _c_str
 from .helpers import _to_str
@@ -14,7 +16,9 @@ from .helpers import LogCallback
 from .helpers import GameState
 from .helpers import ShootingData
 from .prototypes import Prototypes
+from .replay import Recorder
 from .map import Map
+from .profiler import Profiler
 from .world import World
 from .helpers import _unpack_list
 
@@ -42,22 +46,66 @@ def get_steam_path(steam_path: str) -> str:
     return get_default_steam_location()
 
 
+# prebuilt out-of-line ABI module, see _build_ffi.py; parses bots.h otherwise
+def load_ffi():
+    try:
+        from ._bots import ffi
+
+        return ffi
+    except ImportError:
+        pass
+    api_def = open(
+        os.path.join(os.path.split(os.path.abspath(__file__))[0], "bots.h"), "r"
+    ).read()
+    ffi = FFI()
+    ffi.cdef(api_def)
+    return ffi
+
+
+# API mode module compiled against the hardened library, only built on request
+def load_compiled_api():
+    try:
+        from ._bots_api import ffi
+        from ._bots_api import lib
+    except ImportError:
+        return None
+    return ffi, lib
+
+
 class Game:
-    def __init__(self, steam_path: str = "", hardened: bool = True):
-        api_def = open(
-            os.path.join(os.path.split(os.path.abspath(__file__))[0], "bots.h"), "r"
-        ).read()
-
-        steam_path = os.path.expanduser(get_steam_path(steam_path))
-        print("looking for uw library in: " + steam_path)
-        os.chdir(steam_path)
-
-        self._ffi = FFI()
-        self._ffi.cdef(api_def)
-        self._api = self._ffi.dlopen(
-            os.path.join(steam_path, get_lib_name(hardened=hardened))
-        )
+    def __init__(
+        self,
+        steam_path: str = "",
+        hardened: bool = True,
+        components: Optional[set[str]] = None,
+        columnar: bool = False,
+        lazy: bool = False,
+        backend: Optional[Backend] = None,
+        record: str = "",
+        profile: Optional[Profiler] = None,
+        map_cache: str = "",
+    ):
+        compiled = load_compiled_api() if backend is None and hardened else None
+        self._ffi = compiled[0] if compiled is not None else load_ffi()
+        if backend is None:
+            steam_path = os.path.expanduser(get_steam_path(steam_path))
+            print("looking for uw library in: " + steam_path)
+            os.chdir(steam_path)
+            if compiled is not None:
+                self._api = compiled[1]
+            else:
+                self._api = self._ffi.dlopen(
+                    os.path.join(steam_path, get_lib_name(hardened=hardened))
+                )
+        else:
+            self._api = backend.open(self._ffi)
+        if record:
+            self._api = Recorder(self._ffi, self._api, record)
+        self._profiler = profile
+        if profile is not None:
+            self._api, self._ffi = profile.attach(self._api, self._ffi)
         self._api.uwInitialize(self._api.UW_VERSION)
+        self._closed = False
 
         self._connection_state_changed_handler = []
         self._game_state_changed_handler = []
@@ -113,12 +161,25 @@ class Game:
         self._tick = 0
 
         self.prototypes = Prototypes(self._api, self._ffi, self)
-        self.map = Map(self._api, self._ffi, self)
-        self.world = World(self._api, self._ffi, self)
-        self.commands = Commands(self._api, self._ffi)
+        self.map = Map(self._api, self._ffi, self, cache_dir=map_cache)
+        self.world = World(
+            self._api,
+            self._ffi,
+            self,
+            components=components,
+            columnar=columnar,
+            lazy=lazy,
+        )
+        self.commands = Commands(self._api, self._ffi, self)
+
+    # also finishes the recording, a bot ending with a signal never runs __del__
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._api.uwDeinitialize()
 
     def __del__(self):
-        self._api.uwDeinitialize()
+        self.close()
 
     def log(self, message: str, severity: Severity = Severity.Info):
         self._api.uwLog(severity.value, _c_str(message))
@@ -173,6 +234,16 @@ class Game:
     def tick(self) -> int:
         return self._tick
 
+    def profiler(self) -> Optional[Profiler]:
+        return self._profiler
+
+    def _dispatch(self, handlers: list, *args):
+        if self._profiler is not None:
+            self._profiler.run(handlers, *args)
+            return
+        for eh in handlers:
+            eh(*args)
+
     def _exception_callback(self, message):
         print(f"Exception: {_to_str(self._ffi, message)}")
         breakpoint()
@@ -203,17 +274,20 @@ class Game:
         self._map_state_changed_handler.append(callback)
 
     def _map_state_callback(self, state):
-        map_state = MapState(state)
-        for eh in self._map_state_changed_handler:
-            eh(map_state)
+        self._dispatch(self._map_state_changed_handler, MapState(state))
 
     def add_update_callback(self, callback: Callable[[bool], None]):
         self._updating_handler.append(callback)
 
     def _update_callback(self, tick: int, stepping: bool):
         self._tick = tick
-        for eh in self._updating_handler:
-            eh(stepping)
+        if self._profiler is not None:
+            self._profiler.begin_tick(tick)
+        self.commands.begin()
+        try:
+            self._dispatch(self._updating_handler, stepping)
+        finally:
+            self.commands.flush()
 
     def add_shooting_callback(self, callback: Callable[[list[ShootingData]], None]):
         self._shooting_handler.append(callback)
@@ -222,5 +296,4 @@ class Game:
         shooting_data = [
             ShootingData.from_c(i) for i in _unpack_list(self._ffi, shoot_data, "data")
         ]
-        for eh in self._shooting_handler:
-            eh(shooting_data)
+        self._dispatch(self._shooting_handler, shooting_data)
@@ -0,0 +1,271 @@
+import numpy as np
+
+from typing import Optional
+
+from .helpers import MapState
+from .helpers import OverviewFlags
+from .helpers import ShootingData
+from .world import Entity
+from .world import Policy
+
+
+LAYERS = ("own", "enemy", "resources", "combat")
+
+
+# Every layer is the sources diffused over the neighbor graph for radius steps,
+# losing decay per step. That is linear in the sources, so a tick only spreads
+# the difference of the sources that changed instead of recomputing the layers.
+class InfluenceMap:
+    def __init__(
+        self,
+        game,
+        radius: int = 6,
+        decay: float = 0.8,
+        combat_decay: float = 0.9,
+    ):
+        self._game = game
+        self._radius: int = radius
+        self._decay: float = decay
+        self._combat_decay: float = combat_decay
+
+        self._layers: dict[str, np.ndarray] = {}
+        self._sources: dict[str, np.ndarray] = {}
+        self._contributions: dict[int, tuple[str, int, float]] = {}
+        self._pending: dict[str, dict[int, float]] = {name: {} for name in LAYERS}
+        self._strengths: dict[int, tuple[float, float]] = {}
+        self._degrees: Optional[np.ndarray] = None
+        self._shares: Optional[np.ndarray] = None
+        self._indices: Optional[np.ndarray] = None
+        self._starts: Optional[np.ndarray] = None
+        self._my_force: int = 0
+        self._refresh_interval: int = 1000
+        self._ticks_since_refresh: int = 0
+        self._reset(0)
+
+        self._game.add_map_state_callback(self._map_state_changed)
+        self._game.add_update_callback(self._updating)
+        self._game.add_shooting_callback(self._shooting)
+        self._game.world.add_entity_added_callback(self._entity_changed)
+        self._game.world.add_entity_changed_callback(self._entity_changed)
+        self._game.world.add_entity_removed_callback(self._entity_removed)
+        self._game.world.add_policy_changed_callback(self._policy_changed)
+        if self._game.map.tiles_count() > 0:
+            self._rebuild()
+
+    def layer(self, name: str) -> np.ndarray:
+        return self._layers[name]
+
+    def own(self) -> np.ndarray:
+        return self._layers["own"]
+
+    def enemy(self) -> np.ndarray:
+        return self._layers["enemy"]
+
+    def resources(self) -> np.ndarray:
+        return self._layers["resources"]
+
+    def combat(self) -> np.ndarray:
+        return self._layers["combat"]
+
+    # positive where we are stronger than the enemy
+    def balance(self) -> np.ndarray:
+        return self._layers["own"] - self._layers["enemy"]
+
+    def at(self, tile: int) -> dict[str, float]:
+        return {name: float(layer[tile]) for name, layer in self._layers.items()}
+
+    def set_refresh_interval(self, ticks: int):
+        self._refresh_interval = ticks
+
+    def _reset(self, count: int):
+        for name in LAYERS:
+            self._layers[name] = np.zeros(count, dtype=np.float32)
+            self._sources[name] = np.zeros(count, dtype=np.float32)
+            self._pending[name].clear()
+        self._contributions.clear()
+
+    def _rebuild(self):
+        self._reset(self._game.map.tiles_count())
+        self._strengths.clear()
+        self._degrees = None
+        self._my_force = self._game.world.my_force()
+        for o in self._game.world.entities().values():
+            self._entity_changed(o)
+        self._update_resources(np.arange(len(self._sources["resources"])))
+
+    def _strength(self, proto: int) -> tuple[float, float]:
+        strength = self._strengths.get(proto)
+        if strength is None:
+            unit = self._game.prototypes.unit(proto) or {}
+            strength = (float(unit.get("dps", 0)), float(unit.get("life", 0)))
+            self._strengths[proto] = strength
+        return strength
+
+    def _contribution(self, o: Entity) -> Optional[tuple[str, int, float]]:
+        owner = getattr(o, "Owner", None)
+        proto = getattr(o, "Proto", None)
+        position = getattr(o, "Position", None)
+        if owner is None or proto is None or position is None:
+            return None
+        if not hasattr(o, "Unit"):
+            return None
+        tile = int(position.position)
+        if not 0 <= tile < len(self._sources["own"]):
+            return None
+        force = int(owner.force)
+        if force == self._my_force:
+            name = "own"
+        elif self._game.world.policy(force) == Policy.Enemy:
+            name = "enemy"
+        else:
+            return None
+        dps, life = self._strength(int(proto.proto))
+        if dps <= 0:
+            return None
+        current = getattr(o, "Life", None)
+        if current is not None and life > 0:
+            dps *= min(float(current.life) / life, 1.0)
+        return name, tile, dps
+
+    def _move(self, previous, current):
+        if previous == current:
+            return
+        if previous is not None:
+            name, tile, strength = previous
+            pending = self._pending[name]
+            pending[tile] = pending.get(tile, 0.0) - strength
+        if current is not None:
+            name, tile, strength = current
+            pending = self._pending[name]
+            pending[tile] = pending.get(tile, 0.0) + strength
+
+    def _entity_changed(self, o: Entity):
+        current = self._contribution(o)
+        if current is None:
+            previous = self._contributions.pop(o.Id, None)
+        else:
+            previous = self._contributions.get(o.Id)
+            self._contributions[o.Id] = current
+        self._move(previous, current)
+
+    def _entity_removed(self, o: Entity):
+        self._move(self._contributions.pop(o.Id, None), None)
+
+    def _policy_changed(self, force: int, policy: Policy):
+        for o in self._game.world.by_force(force):
+            self._entity_changed(o)
+
+    def _shooting(self, data: list[ShootingData]):
+        pending = self._pending["combat"]
+        count = len(self._sources["combat"])
+        for d in data:
+            for tile in (d.shooter.position, d.target.position):
+                if 0 <= tile < count:
+                    pending[tile] = pending.get(tile, 0.0) + 1.0
+
+    def _map_state_changed(self, state: MapState):
+        if state == MapState.Loaded:
+            self._rebuild()
+
+    # adds sum_k (decay * P) ** k of the deltas at tiles to the layer, where P
+    # hands the value of a tile out evenly to its neighbors
+    def _spread(self, layer: np.ndarray, tiles: np.ndarray, deltas: np.ndarray):
+        if len(tiles) == 0:
+            return
+        offsets, indices = self._game.map.neighbors_csr()
+        if self._degrees is None or len(self._degrees) != len(layer):
+            self._indices = indices.astype(np.int64)
+            degrees = np.diff(offsets.astype(np.int64))
+            self._degrees = degrees
+            self._shares = np.divide(
+                np.float32(1),
+                degrees.astype(np.float32),
+                out=np.zeros(len(degrees), dtype=np.float32),
+                where=degrees > 0,
+            )
+            self._starts = np.minimum(offsets[:-1], max(len(indices) - 1, 0))
+        degrees = self._degrees
+        shares = self._shares
+        indices = self._indices
+        layer[tiles] += deltas
+        values = deltas.astype(np.float32)
+        dense = False
+        for _ in range(self._radius):
+            if not dense and len(tiles) * 4 > len(layer):
+                full = np.zeros(len(layer), dtype=np.float32)
+                full[tiles] = values
+                values, dense = full, True
+            if dense:
+                # neighbors are mutual, so pushing to them equals pulling from them
+                values = np.add.reduceat((values * shares)[indices], self._starts)
+                values[degrees == 0] = 0
+                values *= self._decay
+                layer += values
+                continue
+            starts = offsets[tiles].astype(np.int64)
+            counts = degrees[tiles]
+            firsts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+            edges = np.arange(int(counts.sum())) + firsts
+            if len(edges) == 0:
+                break
+            pushed = np.repeat(values * shares[tiles], counts)
+            tiles, inverse = np.unique(indices[edges], return_inverse=True)
+            values = np.bincount(inverse, weights=pushed, minlength=len(tiles))
+            values *= self._decay
+            layer[tiles] += values
+
+    def _flush(self, name: str):
+        pending = self._pending[name]
+        if not pending:
+            return
+        tiles = np.fromiter(pending.keys(), dtype=np.int64, count=len(pending))
+        deltas = np.fromiter(pending.values(), dtype=np.float32, count=len(pending))
+        pending.clear()
+        self._apply(name, tiles, deltas)
+
+    def _apply(self, name: str, tiles: np.ndarray, deltas: np.ndarray):
+        changed = deltas != 0
+        tiles, deltas = tiles[changed], deltas[changed]
+        if len(tiles):
+            self._sources[name][tiles] += deltas
+            self._spread(self._layers[name], tiles, deltas)
+
+    # respreads the sources to drop the rounding of many small updates; combat
+    # heat fades out on its own
+    def refresh(self):
+        for name in ("own", "enemy", "resources"):
+            self._flush(name)
+            sources = self._sources[name]
+            sources[np.abs(sources) < 1e-4] = 0
+            layer = self._layers[name]
+            layer[:] = 0
+            tiles = np.flatnonzero(sources)
+            self._spread(layer, tiles, sources[tiles])
+
+    def _update_resources(self, changed: np.ndarray):
+        overview = self._game.map.overview_array()
+        if len(changed) == 0 or len(overview) != len(self._sources["resources"]):
+            return
+        flags = overview[changed]
+        current = ((flags & OverviewFlags.Resource.value) != 0).astype(np.float32)
+        deltas = current - self._sources["resources"][changed]
+        self._apply("resources", changed, deltas)
+
+    def _updating(self, stepping: bool):
+        if len(self._layers["own"]) != self._game.map.tiles_count():
+            return
+        if self._game.world.my_force() != self._my_force:
+            self._rebuild()
+        if not stepping:
+            return
+        combat = self._layers["combat"]
+        combat *= self._combat_decay
+        combat[combat < 1e-3] = 0
+        self._sources["combat"][:] = 0
+        self._update_resources(self._game.map.overview_changed())
+        for name in LAYERS:
+            self._flush(name)
+        self._ticks_since_refresh += 1
+        if self._ticks_since_refresh >= self._refresh_interval:
+            self._ticks_since_refresh = 0
+            self.refresh()
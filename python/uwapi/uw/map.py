@@ -1,8 +1,18 @@
 import math
 
+import numpy as np
+
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+
 from .helpers import MapState
 from .helpers import OverviewFlags
 from .helpers import _unpack_list
+from .map_cache import MapCache
+from .pathfinding import Pathfinder
+from .pathfinding import edge_lengths
+from .store import _dtype_of
 
 
 class Vector3:
@@ -13,10 +23,11 @@ class Vector3:
 
 
 class Map:
-    def __init__(self, api, ffi, game):
+    def __init__(self, api, ffi, game, cache_dir: str = ""):
         self._api = api
         self._ffi = ffi
         self._game = game
+        self._cache: Optional[MapCache] = MapCache(cache_dir) if cache_dir else None
 
         self._game.add_map_state_callback(self._map_state_changed)
         self._game.add_update_callback(self._updating)
@@ -25,11 +36,29 @@ class Map:
         self._guid: str = ""
         self._path: str = ""
         self._max_players: int = 0
-        self._positions: list[Vector3] = []
-        self._ups: list[Vector3] = []
-        self._neighbors: list[list[int]] = []
-        self._terrains: list[bytes] = []
-        self._overview: list[OverviewFlags] = []
+        self._positions_array = np.zeros((0, 3), dtype=np.float32)
+        self._ups_array = np.zeros((0, 3), dtype=np.float32)
+        self._terrains_array = np.zeros(0, dtype=np.uint8)
+        self._borders_array = np.zeros(0, dtype=bool)
+        self._neighbor_offsets = np.zeros(1, dtype=np.uint32)
+        self._neighbor_indices = np.zeros(0, dtype=np.uint32)
+        self._overview_dtype = np.dtype(f"u{ffi.sizeof('UwOverviewFlags')}")
+        self._overview_array = np.zeros(0, dtype=self._overview_dtype)
+        self._overview_previous = np.zeros(0, dtype=self._overview_dtype)
+        self._overview_changed = np.zeros(0, dtype=np.int64)
+        self._overview: Optional[list[OverviewFlags]] = None
+
+        # native estimates and yaws memoized per map, keyed by (a, b)
+        self._estimates: dict[tuple[int, int], float] = {}
+        self._yaws: dict[tuple[int, int], float] = {}
+        self._memo_limit: int = 1000000
+        self._derived: dict[str, np.ndarray] = {}
+        self._pathfinder: Optional[Pathfinder] = None
+
+        # list views for existing callers, built on first use
+        self._positions: Optional[list[Vector3]] = None
+        self._ups: Optional[list[Vector3]] = None
+        self._neighbors: Optional[list[list[int]]] = None
 
     def name(self) -> str:
         return self._name
@@ -43,24 +72,119 @@ class Map:
     def max_players(self) -> int:
         return self._max_players
 
+    def tiles_count(self) -> int:
+        return len(self._positions_array)
+
     def positions(self) -> list[Vector3]:
+        if self._positions is None:
+            self._positions = [Vector3(*p) for p in self._positions_array.tolist()]
         return self._positions
 
     def ups(self) -> list[Vector3]:
+        if self._ups is None:
+            self._ups = [Vector3(*u) for u in self._ups_array.tolist()]
         return self._ups
 
     def neighbors(self) -> list[list[int]]:
+        if self._neighbors is None:
+            indices = self._neighbor_indices.tolist()
+            offsets = self._neighbor_offsets.tolist()
+            self._neighbors = [
+                indices[offsets[i] : offsets[i + 1]] for i in range(len(offsets) - 1)
+            ]
         return self._neighbors
 
     def neighbors_of_position(self, pos: int) -> list[int]:
-        return self._neighbors[pos]
+        if self._neighbors is not None:
+            return self._neighbors[pos]
+        start, end = self._neighbor_offsets[pos : pos + 2].tolist()
+        return self._neighbor_indices[start:end].tolist()
+
+    def terrains(self) -> list[int]:
+        return self._terrains_array.tolist()
+
+    def positions_array(self) -> np.ndarray:
+        return self._positions_array
+
+    def ups_array(self) -> np.ndarray:
+        return self._ups_array
+
+    def terrains_array(self) -> np.ndarray:
+        return self._terrains_array
+
+    def borders_array(self) -> np.ndarray:
+        return self._borders_array
+
+    def cache(self) -> Optional[MapCache]:
+        return self._cache
+
+    # per map data computed once and kept in the map cache when there is one
+    def derived(self, name: str, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        array = self._derived.get(name)
+        if array is not None:
+            return array
+        key = self._cache_key()
+        if key:
+            array = self._cache.load_derived(key, name)
+        if array is None:
+            array = np.asarray(compute())
+            if key:
+                self._cache.store_derived(key, name, array)
+        self._derived[name] = array
+        return array
+
+    # neighbors of tile i are indices[offsets[i] : offsets[i + 1]]
+    def neighbors_csr(self) -> tuple[np.ndarray, np.ndarray]:
+        return self._neighbor_offsets, self._neighbor_indices
+
+    def pathfinder(self) -> Pathfinder:
+        if self._pathfinder is None:
+            lengths = self.derived(
+                "edge_lengths",
+                lambda: edge_lengths(
+                    self._positions_array,
+                    self._neighbor_offsets,
+                    self._neighbor_indices,
+                ),
+            )
+            self._pathfinder = Pathfinder(
+                self._positions_array,
+                self._neighbor_offsets,
+                self._neighbor_indices,
+                lengths,
+            )
+        return self._pathfinder
+
+    def find_path(self, start: int, goal: int) -> list[int]:
+        return self.pathfinder().path(start, goal)
 
-    def terrains(self) -> list[bytes]:
-        return self._terrains
+    # inf where unreachable
+    def distance_field(
+        self, sources: Iterable[int], hops: bool = False
+    ) -> np.ndarray:
+        return self.pathfinder().distance_field(sources, hops)
+
+    def set_blocked(self, tiles: Iterable[int], blocked: bool = True):
+        self.pathfinder().set_blocked(tiles, blocked)
 
     def overview(self) -> list[OverviewFlags]:
+        if self._overview is None:
+            self._overview = [
+                OverviewFlags(i) for i in self._overview_array.tolist()
+            ]
         return self._overview
 
+    # flags per tile, empty outside stepping ticks
+    def overview_array(self) -> np.ndarray:
+        return self._overview_array
+
+    def overview_mask(self, flags: OverviewFlags) -> np.ndarray:
+        return (self._overview_array & flags.value) != 0
+
+    # tiles whose flags differ from the previous stepping tick
+    def overview_changed(self) -> np.ndarray:
+        return self._overview_changed
+
     def entities(self, position: int) -> list[int]:
         ns = self._ffi.new("struct UwIds *")
         self._api.uwOverviewIds(position, ns)
@@ -101,21 +225,59 @@ class Map:
         )
 
     def distance_line(self, ai: int, bi: int) -> float:
-        a: Vector3 = self._positions[ai]
-        b: Vector3 = self._positions[bi]
-        x: float = a.x - b.x
-        y: float = a.y - b.y
-        z: float = a.z - b.z
-        x *= x
-        y *= y
-        z *= z
-        return math.sqrt(x + y + z)
-
-    def distance_estimate(self, a: int, b: int) -> float:
-        return self._api.uwDistanceEstimate(a, b)
-
-    def yaw(self, a: int, b: int) -> float:
-        return self._api.uwYaw(a, b)
+        x, y, z = (self._positions_array[ai] - self._positions_array[bi]).tolist()
+        return math.sqrt(x * x + y * y + z * z)
+
+    def distances_from(self, tile: int, tiles: Iterable[int]) -> np.ndarray:
+        tiles = np.asarray(tiles, dtype=np.int64)
+        return np.linalg.norm(
+            self._positions_array[tiles] - self._positions_array[tile], axis=-1
+        )
+
+    def pairwise_distances(
+        self, tiles_a: Iterable[int], tiles_b: Iterable[int]
+    ) -> np.ndarray:
+        a = self._positions_array[np.asarray(tiles_a, dtype=np.int64)]
+        b = self._positions_array[np.asarray(tiles_b, dtype=np.int64)]
+        return np.linalg.norm(a[:, None, :] - b[None, :, :], axis=-1)
+
+    # indices into candidates, closest first
+    def nearest(self, tile: int, candidates: Iterable[int], k: int = 1) -> np.ndarray:
+        distances = self.distances_from(tile, candidates)
+        k = min(k, len(distances))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        if k < len(distances):
+            closest = np.argpartition(distances, k - 1)[:k]
+        else:
+            closest = np.arange(len(distances))
+        return closest[np.argsort(distances[closest], kind="stable")]
+
+    def distance_estimate(self, a: int, b: int, cached: bool = False) -> float:
+        if not cached:
+            return self._api.uwDistanceEstimate(a, b)
+        return self._memoized(self._estimates, self._api.uwDistanceEstimate, a, b)
+
+    def estimates_from(
+        self, tile: int, tiles: Iterable[int], cached: bool = True
+    ) -> np.ndarray:
+        return np.array(
+            [self.distance_estimate(tile, t, cached) for t in tiles], dtype=np.float32
+        )
+
+    def yaw(self, a: int, b: int, cached: bool = False) -> float:
+        if not cached:
+            return self._api.uwYaw(a, b)
+        return self._memoized(self._yaws, self._api.uwYaw, a, b)
+
+    def _memoized(self, memo: dict, function, a: int, b: int) -> float:
+        key = (a, b)
+        value = memo.get(key)
+        if value is None:
+            if len(memo) >= self._memo_limit:
+                memo.clear()
+            value = memo[key] = function(a, b)
+        return value
 
     def test_construction_placement(
         self, construction_prototype: int, position: int
@@ -129,11 +291,17 @@ class Map:
 
     def _load(self):
         self._game.log("loading map")
-        self._positions = []
-        self._ups = []
-        self._neighbors = []
-        self._terrains = []
-        self._overview = []
+        self._positions = None
+        self._ups = None
+        self._neighbors = None
+        self._overview = None
+        self._overview_array = np.zeros(0, dtype=self._overview_dtype)
+        self._overview_previous = np.zeros(0, dtype=self._overview_dtype)
+        self._overview_changed = np.zeros(0, dtype=np.int64)
+        self._estimates = {}
+        self._yaws = {}
+        self._derived = {}
+        self._pathfinder = None
 
         info = self._ffi.new("struct UwMapInfo *")
         self._api.uwMapInfo(info)
@@ -143,36 +311,99 @@ class Map:
         self._max_players = info.maxPlayers
 
         count = self._api.uwTilesCount()
-        tile = self._ffi.new("struct UwTile *")
-        for i in range(count):
-            self._api.uwTile(i, tile)
-            p = Vector3(tile.position[0], tile.position[1], tile.position[2])
-            self._positions.append(p)
-            u = Vector3(tile.up[0], tile.up[1], tile.up[2])
-            self._ups.append(u)
-            n = (
-                self._ffi.unpack(tile.neighborsIndices, tile.neighborsCount)
-                if tile.neighborsCount > 0
-                else []
+        key = self._cache_key()
+        cached = self._cache.load(key, count) if key else None
+        if cached is not None:
+            self._positions_array = cached["positions"]
+            self._ups_array = cached["ups"]
+            self._terrains_array = cached["terrains"]
+            self._borders_array = cached["borders"]
+            self._neighbor_offsets = cached["neighbor_offsets"]
+            self._neighbor_indices = cached["neighbor_indices"]
+            self._game.log("map loaded from cache")
+            return
+        self._load_tiles(count)
+        if key:
+            self._cache.store(
+                key,
+                count,
+                {
+                    "positions": self._positions_array,
+                    "ups": self._ups_array,
+                    "terrains": self._terrains_array,
+                    "borders": self._borders_array,
+                    "neighbor_offsets": self._neighbor_offsets,
+                    "neighbor_indices": self._neighbor_indices,
+                },
             )
-            self._neighbors.append(n)
-            self._terrains.append(tile.terrain)
 
         self._game.log("map loaded")
 
+    def _cache_key(self) -> str:
+        if self._cache is None:
+            return ""
+        guid = self._guid
+        return guid.decode("utf-8") if isinstance(guid, bytes) else guid
+
+    def _load_tiles(self, count: int):
+        tiles = self._ffi.new("struct UwTile[]", count)
+        uw_tile = self._api.uwTile
+        buffer = self._ffi.buffer
+        # the neighbors are only valid until the next uwTile call
+        neighbors = []
+        for i in range(count):
+            tile = tiles + i
+            uw_tile(i, tile)
+            if tile.neighborsCount > 0:
+                size = tile.neighborsCount * 4
+                neighbors.append(buffer(tile.neighborsIndices, size)[:])
+        data = np.frombuffer(
+            self._ffi.buffer(tiles),
+            dtype=_dtype_of(self._ffi, self._ffi.typeof("struct UwTile")),
+        )
+        self._positions_array = data["position"].copy()
+        self._ups_array = data["up"].copy()
+        self._terrains_array = data["terrain"].copy()
+        self._borders_array = data["border"].copy()
+        offsets = np.zeros(count + 1, dtype=np.uint32)
+        np.cumsum(data["neighborsCount"], out=offsets[1:])
+        self._neighbor_offsets = offsets
+        self._neighbor_indices = np.frombuffer(bytearray().join(neighbors), np.uint32)
+
     def _map_state_changed(self, map_state: MapState):
         if map_state == MapState.Loaded:
             self._load()
 
     def _updating(self, stepping: bool):
-        if stepping:
-            ex = self._ffi.new("struct UwOverviewExtract *")
-            self._api.uwOverviewExtract(ex)
-            if ex.count > 0:
-                self._overview = [
-                    OverviewFlags(i) for i in _unpack_list(self._ffi, ex, "flags")
-                ]
-            else:
-                self._overview = []
+        self._overview = None
+        if not stepping:
+            if len(self._overview_array):
+                self._overview_previous = self._overview_array
+                self._overview_array = self._overview_array[:0]
+            self._overview_changed = self._overview_changed[:0]
+            return
+        ex = self._ffi.new("struct UwOverviewExtract *")
+        self._api.uwOverviewExtract(ex)
+        previous = (
+            self._overview_array
+            if len(self._overview_array)
+            else self._overview_previous
+        )
+        current = self._overview_previous
+        if ex.count > 0:
+            flags = np.frombuffer(
+                self._ffi.buffer(ex.flags, ex.count * self._overview_dtype.itemsize),
+                dtype=self._overview_dtype,
+            )
+            # reuse the buffer from two ticks ago
+            if current is previous or len(current) != ex.count:
+                current = np.empty(ex.count, dtype=self._overview_dtype)
+            np.copyto(current, flags)
+        else:
+            current = current[:0]
+        if len(previous) == len(current):
+            self._overview_changed = np.flatnonzero(previous != current)
         else:
-            self._overview = []
+            self._overview_changed = np.arange(len(current))
+        self._overview_previous = previous
+        self._overview_array = current
@@ -0,0 +1,111 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+from typing import Optional
+
+
+CACHE_VERSION = 1
+
+TILE_ARRAYS = (
+    "positions",
+    "ups",
+    "terrains",
+    "borders",
+    "neighbor_offsets",
+    "neighbor_indices",
+)
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^0-9A-Za-z_.-]", "_", name)
+
+
+# One directory per map guid holding an .npy file per array, loaded memory
+# mapped so that bots on the same host share the pages. Directories and files
+# are written under temporary names and renamed into place.
+class MapCache:
+    def __init__(self, directory: str):
+        self._directory = os.path.expanduser(directory)
+
+    def directory(self) -> str:
+        return self._directory
+
+    def path(self, guid: str) -> str:
+        return os.path.join(
+            self._directory, f"{_safe_name(guid)}.v{CACHE_VERSION}"
+        )
+
+    def _meta(self, guid: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.path(guid), "meta.json"), "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != CACHE_VERSION or meta.get("guid") != guid:
+            return None
+        return meta
+
+    def load(self, guid: str, tiles: int) -> Optional[dict[str, np.ndarray]]:
+        meta = self._meta(guid)
+        if meta is None or meta.get("tiles") != tiles:
+            return None
+        try:
+            return {
+                name: np.load(
+                    os.path.join(self.path(guid), f"{name}.npy"), mmap_mode="r"
+                )
+                for name in TILE_ARRAYS
+            }
+        except (OSError, ValueError):
+            return None
+
+    def store(self, guid: str, tiles: int, arrays: dict[str, np.ndarray]):
+        os.makedirs(self._directory, exist_ok=True)
+        target = self.path(guid)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self._directory)
+        try:
+            for name in TILE_ARRAYS:
+                np.save(os.path.join(staging, f"{name}.npy"), arrays[name])
+            meta = {"version": CACHE_VERSION, "guid": guid, "tiles": tiles}
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            if os.path.isdir(target):
+                shutil.rmtree(target, ignore_errors=True)
+            try:
+                os.rename(staging, target)
+            except OSError:
+                # another process stored the same map first
+                pass
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def load_derived(self, guid: str, name: str) -> Optional[np.ndarray]:
+        if self._meta(guid) is None:
+            return None
+        try:
+            return np.load(
+                os.path.join(self.path(guid), f"derived-{_safe_name(name)}.npy"),
+                mmap_mode="r",
+            )
+        except (OSError, ValueError):
+            return None
+
+    def store_derived(self, guid: str, name: str, array: np.ndarray):
+        if self._meta(guid) is None:
+            return
+        path = os.path.join(self.path(guid), f"derived-{_safe_name(name)}.npy")
+        fd, staging = tempfile.mkstemp(
+            prefix=".staging-", suffix=".npy", dir=self.path(guid)
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, array)
+            os.replace(staging, path)
+        except OSError:
+            if os.path.exists(staging):
+                os.remove(staging)
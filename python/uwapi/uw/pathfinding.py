@@ -0,0 +1,203 @@
+import heapq
+import math
+
+import numpy as np
+
+from collections import OrderedDict
+from typing import Iterable
+from typing import Optional
+
+
+def edge_lengths(
+    positions: np.ndarray, offsets: np.ndarray, indices: np.ndarray
+) -> np.ndarray:
+    sources = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    return np.linalg.norm(
+        positions[indices] - positions[sources], axis=-1
+    ).astype(np.float32)
+
+
+class Pathfinder:
+    def __init__(
+        self,
+        positions: np.ndarray,
+        offsets: np.ndarray,
+        indices: np.ndarray,
+        lengths: Optional[np.ndarray] = None,
+        capacity: int = 32,
+    ):
+        self._positions = np.asarray(positions, dtype=np.float32)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self._indices = np.asarray(indices, dtype=np.int64)
+        self._lengths = (
+            np.asarray(lengths, dtype=np.float32)
+            if lengths is not None
+            else edge_lengths(self._positions, self._offsets, self._indices)
+        )
+        self._sources = np.repeat(
+            np.arange(len(self._offsets) - 1), np.diff(self._offsets)
+        )
+        self._blocked = np.zeros(len(self._offsets) - 1, dtype=bool)
+        self._capacity: int = capacity
+        self._fields: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._lists: Optional[tuple] = None
+
+    def tiles_count(self) -> int:
+        return len(self._blocked)
+
+    def blocked(self) -> np.ndarray:
+        return self._blocked
+
+    def set_capacity(self, capacity: int):
+        self._capacity = capacity
+        self._evict()
+
+    def cached_fields(self) -> int:
+        return len(self._fields)
+
+    def clear(self):
+        self._fields.clear()
+
+    # edges leaving the given tiles, and how many per tile
+    def _edges(self, tiles: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        starts = self._offsets[tiles]
+        counts = self._offsets[tiles + 1] - starts
+        firsts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return np.arange(int(counts.sum())) + firsts, counts
+
+    def path(self, start: int, goal: int) -> list[int]:
+        if start == goal:
+            return [start]
+        if self._lists is None:
+            self._lists = (
+                self._positions.tolist(),
+                self._offsets.tolist(),
+                self._indices.tolist(),
+                self._lengths.tolist(),
+            )
+        positions, offsets, indices, lengths = self._lists
+        blocked = self._blocked
+        gx, gy, gz = positions[goal]
+
+        def heuristic(tile: int) -> float:
+            x, y, z = positions[tile]
+            return math.sqrt((x - gx) ** 2 + (y - gy) ** 2 + (z - gz) ** 2)
+
+        costs = {start: 0.0}
+        came_from = {}
+        heap = [(heuristic(start), 0.0, start)]
+        while heap:
+            _, cost, tile = heapq.heappop(heap)
+            if tile == goal:
+                path = [goal]
+                while path[-1] != start:
+                    path.append(came_from[path[-1]])
+                path.reverse()
+                return path
+            if cost > costs[tile]:
+                continue
+            for e in range(offsets[tile], offsets[tile + 1]):
+                n = indices[e]
+                if blocked[n] and n != goal:
+                    continue
+                c = cost + lengths[e]
+                if c < costs.get(n, math.inf):
+                    costs[n] = c
+                    came_from[n] = tile
+                    heapq.heappush(heap, (c + heuristic(n), c, n))
+        return []
+
+    def _key(self, sources: Iterable[int], hops: bool) -> tuple:
+        return (tuple(sorted(set(int(s) for s in sources))), hops)
+
+    def distance_field(
+        self, sources: Iterable[int], hops: bool = False
+    ) -> np.ndarray:
+        key = self._key(sources, hops)
+        field = self._fields.get(key)
+        if field is not None:
+            self._fields.move_to_end(key)
+            return field
+        field = self._compute(key)
+        self._fields[key] = field
+        self._evict()
+        return field
+
+    def _compute(self, key: tuple) -> np.ndarray:
+        sources, hops = key
+        field = np.full(self.tiles_count(), np.inf, dtype=np.float32)
+        seeds = np.array(sources, dtype=np.int64)
+        field[seeds] = 0
+        self._relax(field, seeds, hops)
+        field.flags.writeable = False
+        return field
+
+    def _evict(self):
+        while len(self._fields) > self._capacity:
+            self._fields.popitem(last=False)
+
+    # label correcting relaxation, one vectorized step per frontier
+    def _relax(self, field: np.ndarray, frontier: np.ndarray, hops: bool):
+        while len(frontier):
+            edges, counts = self._edges(frontier)
+            targets = self._indices[edges]
+            weights = 1.0 if hops else self._lengths[edges]
+            candidates = np.repeat(field[frontier], counts) + weights
+            open_ = ~self._blocked[targets]
+            targets = targets[open_]
+            candidates = candidates[open_]
+            before = field[targets]
+            np.minimum.at(field, targets, candidates)
+            improved = targets[field[targets] < before]
+            frontier = np.unique(improved)
+
+    def set_blocked(self, tiles: Iterable[int], blocked: bool = True):
+        tiles = np.asarray(list(tiles), dtype=np.int64)
+        tiles = tiles[self._blocked[tiles] != blocked]
+        if len(tiles) == 0:
+            return
+        self._blocked[tiles] = blocked
+        if len(tiles) * 1000 > self.tiles_count():
+            for key in self._fields:
+                self._fields[key] = self._compute(key)
+            return
+        for (sources, hops), field in self._fields.items():
+            field.flags.writeable = True
+            if blocked:
+                self._block(field, tiles, np.array(sources, dtype=np.int64), hops)
+            else:
+                self._unblock(field, tiles, hops)
+            field.flags.writeable = False
+
+    # tiles whose shortest path ran through a newly blocked tile are those
+    # reachable from it over tight edges; they are recomputed from their border
+    def _block(self, field: np.ndarray, tiles: np.ndarray, sources, hops: bool):
+        tiles = tiles[~np.isin(tiles, sources) & np.isfinite(field[tiles])]
+        if len(tiles) == 0:
+            return
+        affected = np.zeros(len(field), dtype=bool)
+        affected[tiles] = True
+        frontier = tiles
+        while len(frontier):
+            edges, counts = self._edges(frontier)
+            targets = self._indices[edges]
+            weights = 1.0 if hops else self._lengths[edges]
+            reached = np.repeat(field[frontier], counts) + weights
+            tight = field[targets] >= reached * (1 - 1e-6)
+            frontier = np.unique(targets[tight & ~affected[targets]])
+            affected[frontier] = True
+        affected[sources] = False
+        field[affected] = np.inf
+        edges, _ = self._edges(np.flatnonzero(affected))
+        border = self._indices[edges]
+        border = np.unique(border[np.isfinite(field[border])])
+        self._relax(field, border, hops)
+
+    # freed tiles can only shorten distances
+    def _unblock(self, field: np.ndarray, tiles: np.ndarray, hops: bool):
+        edges, counts = self._edges(tiles)
+        weights = 1.0 if hops else self._lengths[edges]
+        np.minimum.at(
+            field, np.repeat(tiles, counts), field[self._indices[edges]] + weights
+        )
+        self._relax(field, tiles[np.isfinite(field[tiles])], hops)
@@ -0,0 +1,177 @@
+import time
+
+import numpy as np
+
+from collections import Counter
+from collections import defaultdict
+from collections import deque
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+
+def _handler_name(handler) -> str:
+    owner = getattr(handler, "__self__", None)
+    if owner is not None:
+        return f"{type(owner).__name__}.{handler.__name__}"
+    return getattr(handler, "__qualname__", repr(handler))
+
+
+class _CountingApi:
+    def __init__(self, api, calls: Counter):
+        self._api = api
+        self._calls = calls
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+        calls = self._calls
+
+        def counted(*args):
+            calls[name] += 1
+            return attr(*args)
+
+        setattr(self, name, counted)
+        return counted
+
+
+class _CountingFfi:
+    def __init__(self, ffi, profiler):
+        self._ffi = ffi
+        self._profiler = profiler
+
+    def new(self, *args):
+        self._profiler._allocations += 1
+        return self._ffi.new(*args)
+
+    def __getattr__(self, name: str):
+        return getattr(self._ffi, name)
+
+
+class Profiler:
+    def __init__(
+        self,
+        window: int = 200,
+        summary_interval: int = 0,
+        sink: Optional[Callable[[dict], None]] = None,
+    ):
+        self._window: int = window
+        self._summary_interval: int = summary_interval
+        self._sink = sink
+
+        self._tick: Optional[int] = None
+        self._ticks: int = 0
+        self._handler_times: defaultdict[str, float] = defaultdict(float)
+        self._calls: Counter = Counter()
+        self._allocations: int = 0
+
+        self._history: dict[str, deque] = {}
+        self._calls_history: dict[str, deque] = {}
+        self._allocations_history: deque = deque(maxlen=window)
+        self._tick_history: deque = deque(maxlen=window)
+        self._calls_total: Counter = Counter()
+        self._names: dict[Any, str] = {}
+
+    def attach(self, api, ffi) -> tuple[Any, Any]:
+        return _CountingApi(api, self._calls), _CountingFfi(ffi, self)
+
+    def set_sink(self, sink: Optional[Callable[[dict], None]], summary_interval: int):
+        self._sink = sink
+        self._summary_interval = summary_interval
+
+    def run(self, handlers: list, *args):
+        perf_counter = time.perf_counter
+        times = self._handler_times
+        names = self._names
+        for eh in handlers:
+            start = perf_counter()
+            eh(*args)
+            elapsed = perf_counter() - start
+            name = names.get(eh)
+            if name is None:
+                name = names[eh] = _handler_name(eh)
+            times[name] += elapsed
+
+    def begin_tick(self, tick: int):
+        if self._tick is not None:
+            self._end_tick()
+        self._tick = tick
+
+    # a tick spans from its update callback to the next one
+    def _end_tick(self):
+        self._ticks += 1
+        self._tick_history.append(sum(self._handler_times.values()))
+        for name in self._history.keys() | self._handler_times.keys():
+            if name not in self._history:
+                self._history[name] = deque(maxlen=self._window)
+            self._history[name].append(self._handler_times.get(name, 0.0))
+        for name in self._calls_history.keys() | self._calls.keys():
+            if name not in self._calls_history:
+                self._calls_history[name] = deque(maxlen=self._window)
+            self._calls_history[name].append(self._calls.get(name, 0))
+        self._allocations_history.append(self._allocations)
+        self._calls_total.update(self._calls)
+        self._handler_times.clear()
+        self._calls.clear()
+        self._allocations = 0
+        if (
+            self._sink is not None
+            and self._summary_interval > 0
+            and self._ticks % self._summary_interval == 0
+        ):
+            self._sink(self.summary())
+
+    def handlers(self) -> list[str]:
+        return list(self._history)
+
+    def handler_times(self, name: str) -> np.ndarray:
+        return np.array(self._history.get(name, ()), dtype=np.float64)
+
+    def tick_times(self) -> np.ndarray:
+        return np.array(self._tick_history, dtype=np.float64)
+
+    def calls(self, name: str) -> np.ndarray:
+        return np.array(self._calls_history.get(name, ()), dtype=np.int64)
+
+    def calls_total(self) -> Counter:
+        return self._calls_total + self._calls
+
+    def allocations(self) -> np.ndarray:
+        return np.array(self._allocations_history, dtype=np.int64)
+
+    def histogram(self, name: str, bins: int = 20) -> tuple[np.ndarray, np.ndarray]:
+        times = self.tick_times() if name == "tick" else self.handler_times(name)
+        return np.histogram(times * 1000, bins=bins)
+
+    @staticmethod
+    def _stats(values: np.ndarray, scale: float = 1) -> dict[str, float]:
+        if len(values) == 0:
+            return {"mean": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+        values = values * scale
+        return {
+            "mean": float(values.mean()),
+            "p50": float(np.percentile(values, 50)),
+            "p99": float(np.percentile(values, 99)),
+            "max": float(values.max()),
+        }
+
+    # times in milliseconds, calls and allocations per tick
+    def summary(self) -> dict[str, Any]:
+        return {
+            "ticks": len(self._tick_history),
+            "tick": self._stats(self.tick_times(), 1000),
+            "handlers": {
+                name: self._stats(self.handler_times(name), 1000)
+                for name in self._history
+            },
+            "calls": {
+                name: self._stats(self.calls(name))
+                for name in sorted(
+                    self._calls_history,
+                    key=lambda n: sum(self._calls_history[n]),
+                    reverse=True,
+                )
+            },
+            "allocations": self._stats(self.allocations()),
+        }
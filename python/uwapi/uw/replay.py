@@ -0,0 +1,300 @@
+import gzip
+import marshal
+import struct
+
+from typing import Any
+from typing import Iterator
+
+from .backend import _CALLBACK_SETTERS
+from .backend import Backend
+from .backend import dump_struct
+from .backend import load_struct
+
+
+FORMAT = "uwapi-replay"
+FORMAT_VERSION = 2
+
+_CONNECT_FUNCTIONS = (
+    "uwConnectFindLan",
+    "uwConnectDirect",
+    "uwConnectLobbyId",
+    "uwConnectNewServer",
+    "uwTryReconnect",
+)
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+_LENGTH = struct.Struct("<I")
+
+
+# frames hold plain values only, marshalled behind their length; a log cut off
+# by a killed process ends at its last whole frame
+def read_frames(path: str) -> Iterator[tuple]:
+    with _open(path, "rb") as f:
+        while True:
+            try:
+                header = f.read(_LENGTH.size)
+                if len(header) < _LENGTH.size:
+                    return
+                (length,) = _LENGTH.unpack(header)
+                data = f.read(length)
+            except EOFError:
+                return
+            if len(data) < length:
+                return
+            yield marshal.loads(data)
+
+
+def _is_entity(ffi, value) -> bool:
+    return ffi.typeof(value) == ffi.typeof("UwEntity *")
+
+
+def _is_string(ffi, value) -> bool:
+    ctype = ffi.typeof(value)
+    return ctype.kind in ("pointer", "array") and ctype.item.cname == "char"
+
+
+class Recorder:
+    def __init__(self, ffi, api, path: str):
+        self._ffi = ffi
+        self._api = api
+        self._file = _open(path, "wb")
+        self._pointers: dict[int, int] = {}
+        self._delegates = []
+        self._write((FORMAT, FORMAT_VERSION, {"UW_VERSION": api.UW_VERSION}))
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def _write(self, frame: tuple):
+        if self._file.closed:
+            return
+        data = marshal.dumps(frame, 4)
+        self._file.write(_LENGTH.pack(len(data)) + data)
+
+    def _entity_id(self, e) -> int:
+        _id = self._pointers.get(int(self._ffi.cast("uintptr_t", e)))
+        return _id if _id is not None else self._api.uwEntityId(e)
+
+    def _key(self, args) -> tuple:
+        key = []
+        for a in args:
+            if not isinstance(a, self._ffi.CData):
+                key.append(a)
+            elif _is_entity(self._ffi, a):
+                key.append(("e", self._entity_id(a)))
+            else:
+                key.append(None)
+        return tuple(key)
+
+    def _result(self, result) -> Any:
+        if not isinstance(result, self._ffi.CData):
+            return result
+        if _is_string(self._ffi, result) and result != self._ffi.NULL:
+            return self._ffi.string(result)
+        return None
+
+    def _outputs(self, args) -> list[tuple]:
+        outputs = []
+        for i, a in enumerate(args):
+            if not isinstance(a, self._ffi.CData) or _is_entity(self._ffi, a):
+                continue
+            ctype = self._ffi.typeof(a)
+            if ctype.kind == "pointer" and ctype.item.kind == "struct":
+                outputs.append((i,) + dump_struct(self._ffi, a))
+        return outputs
+
+    def _callback_arg(self, a) -> Any:
+        if not isinstance(a, self._ffi.CData):
+            return a
+        if a == self._ffi.NULL:
+            return None
+        if _is_string(self._ffi, a):
+            return self._ffi.string(a)
+        return dump_struct(self._ffi, a)
+
+    def _wrap_setter(self, name: str, setter):
+        def wrapped(callback):
+            # callbacks may fire from calls made inside other callbacks, the
+            # end frame tells which calls belong to which one
+            def hook(*args):
+                self._write(("cb", name, [self._callback_arg(a) for a in args]))
+                try:
+                    return callback(*args)
+                finally:
+                    self._write(("end",))
+                    if name == "uwSetUpdateCallback":
+                        self._file.flush()
+
+            delegate = self._ffi.callback(self._ffi.typeof(callback), hook)
+            self._delegates.append(delegate)
+            return setter(delegate)
+
+        return wrapped
+
+    def _wrap_entity_pointer(self, function):
+        def wrapped(_id):
+            e = function(_id)
+            self._pointers[int(self._ffi.cast("uintptr_t", e))] = _id
+            return e
+
+        return wrapped
+
+    def _wrap_call(self, name: str, function):
+        def wrapped(*args):
+            key = self._key(args)
+            result = function(*args)
+            # a failed query leaves its output undefined
+            outputs = self._outputs(args) if result is not False else []
+            self._write(("c", name, key, self._result(result), outputs))
+            if name == "uwDeinitialize":
+                self.close()
+            elif name == "uwAllEntities":
+                self._forget_removed(args[0])
+            return result
+
+        return wrapped
+
+    def _forget_removed(self, ids):
+        if len(self._pointers) <= ids.count:
+            return
+        alive = set(self._ffi.unpack(ids.ids, ids.count)) if ids.count else set()
+        self._pointers = {p: i for p, i in self._pointers.items() if i in alive}
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+        if name in _CALLBACK_SETTERS:
+            wrapped = self._wrap_setter(name, attr)
+        elif name == "uwEntityPointer":
+            wrapped = self._wrap_entity_pointer(attr)
+        else:
+            wrapped = self._wrap_call(name, attr)
+        setattr(self, name, wrapped)
+        return wrapped
+
+
+class Replay(Backend):
+    def __init__(self, path: str):
+        super().__init__()
+        self._frames = read_frames(path)
+        header = next(self._frames, None)
+        if header is None or header[0] != FORMAT:
+            raise ValueError(f"not a uwapi replay: {path}")
+        if header[1] != FORMAT_VERSION:
+            raise ValueError(f"unsupported replay version {header[1]}: {path}")
+        for name, value in header[2].items():
+            setattr(self, name, value)
+        self._state: dict[tuple, tuple] = {}
+        self._defaults: dict[str, Any] = {}
+        self._nested: dict[tuple, list[list[tuple]]] = {}
+        self._finished = False
+
+    def run(self) -> bool:
+        if self._finished:
+            return False
+        for frame in self._frames:
+            if frame[0] == "c":
+                self._store(frame)
+            elif frame[0] == "cb":
+                # a callback is answered from its own calls only
+                self._state.clear()
+                self._nested.clear()
+                self._read_callback()
+                self._keep = []
+                self._replay_callback(frame[1], frame[2])
+        self._finished = True
+        return True
+
+    def _store(self, frame: tuple):
+        _, name, key, result, outputs = frame
+        self._state[(name, key)] = (result, outputs)
+        if name not in self._defaults and result is not None:
+            self._defaults[name] = type(result)()
+
+    # reads the calls of a callback up to its end frame; callbacks nested in it
+    # are fired again from the call they were recorded in
+    def _read_callback(self):
+        fired = []
+        for frame in self._frames:
+            if frame[0] == "end":
+                return
+            if frame[0] == "cb":
+                self._read_callback()
+                fired.append((frame[1], frame[2]))
+            elif frame[0] == "c":
+                self._store(frame)
+                if fired:
+                    key = (frame[1], frame[2])
+                    self._nested.setdefault(key, []).append(fired)
+                    fired = []
+
+    def _replay_callback(self, setter: str, args: list):
+        cb = self._callbacks.get(setter)
+        if cb is None:
+            return
+        ctype = self._ffi.typeof(cb)
+        converted = []
+        for i, a in enumerate(args):
+            if isinstance(a, tuple):
+                ptr = self._ffi.new(ctype.args[i])
+                load_struct(self._ffi, ptr, a[0], a[1], self._keep)
+                a = ptr
+            elif isinstance(a, bytes):
+                a = self._ffi.new("char[]", a)
+                self._keep.append(a)
+            elif a is None:
+                a = self._ffi.NULL
+            converted.append(a)
+        cb(*converted)
+
+    def _key(self, args) -> tuple:
+        key = []
+        for a in args:
+            if not isinstance(a, self._ffi.CData):
+                key.append(a)
+            elif _is_entity(self._ffi, a):
+                key.append(("e", self.uwEntityId(a)))
+            else:
+                key.append(None)
+        return tuple(key)
+
+    def _answer(self, name: str, args):
+        key = self._key(args)
+        nested = self._nested.get((name, key))
+        if nested:
+            for setter, cb_args in nested.pop(0):
+                self._replay_callback(setter, cb_args)
+        entry = self._state.get((name, key))
+        if entry is None:
+            return self._defaults.get(name)
+        result, outputs = entry
+        for i, raw, pointed in outputs:
+            load_struct(self._ffi, args[i], raw, pointed, self._keep)
+        if isinstance(result, bytes):
+            result = self._ffi.new("char[]", result)
+            self._keep.append(result)
+        return result
+
+    def __getattr__(self, name: str):
+        if name in _CALLBACK_SETTERS:
+            return super().__getattr__(name)
+        if name in _CONNECT_FUNCTIONS:
+
+            def connect(*args):
+                return self.run()
+
+            return connect
+
+        def call(*args):
+            return self._answer(name, args)
+
+        setattr(self, name, call)
+        return call
@@ -0,0 +1,152 @@
+import inspect
+import time
+
+from typing import Any
+from typing import Callable
+from typing import Iterator
+from typing import Optional
+
+
+class Task:
+    def __init__(
+        self,
+        name: str,
+        function: Callable[[], Any],
+        priority: int = 0,
+        period: int = 1,
+        cost_ms: float = 0.0,
+        offset: int = 0,
+    ):
+        self.name = name
+        self.function = function
+        self.priority = priority
+        self.period = max(1, period)
+        self.cost_ms = cost_ms
+        self.offset = offset
+        self.phase: int = 0
+        self.due: int = 0
+        self.started: int = 0
+        self.elapsed_ms: float = 0.0
+        self.runs: int = 0
+        self.generator: Optional[Iterator] = None
+
+    def running(self) -> bool:
+        return self.generator is not None
+
+
+class Scheduler:
+    def __init__(self, game, budget_ms: float = 20.0, smoothing: float = 0.2):
+        self._game = game
+        self._budget_ms: float = budget_ms
+        self._smoothing: float = smoothing
+        self._tasks: dict[str, Task] = {}
+        self._spent_ms: float = 0.0
+        self._started: bool = False
+
+        self._game.add_update_callback(self._updating)
+
+    def budget_ms(self) -> float:
+        return self._budget_ms
+
+    def set_budget_ms(self, budget_ms: float):
+        self._budget_ms = budget_ms
+
+    def spent_ms(self) -> float:
+        return self._spent_ms
+
+    def tasks(self) -> list[Task]:
+        return list(self._tasks.values())
+
+    def task(self, name: str) -> Optional[Task]:
+        return self._tasks.get(name)
+
+    def add_task(
+        self,
+        name: str,
+        function: Callable[[], Any],
+        priority: int = 0,
+        period: int = 1,
+        cost_ms: float = 0.0,
+        offset: int = 0,
+    ) -> Task:
+        task = Task(name, function, priority, period, cost_ms, offset)
+        if self._started:
+            self._anchor(task, self._game.tick())
+        self._tasks[name] = task
+        return task
+
+    # offsets count from the first tick the scheduler runs at, tasks with the
+    # same period but different offsets then never come due together
+    def _anchor(self, task: Task, tick: int):
+        task.due = tick + task.offset
+        task.phase = task.due % task.period
+
+    def remove_task(self, name: str):
+        self._tasks.pop(name, None)
+
+    def _candidates(self, tick: int) -> list[Task]:
+        tasks = [t for t in self._tasks.values() if t.running() or t.due <= tick]
+        # higher priority first, then whichever has waited longest
+        tasks.sort(key=lambda t: (-t.priority, t.due))
+        return tasks
+
+    def _measured(self, task: Task, elapsed_ms: float):
+        task.cost_ms += (elapsed_ms - task.cost_ms) * self._smoothing
+
+    # the estimate is of a whole run, summed over the ticks a generator spans
+    def _finish(self, task: Task, tick: int):
+        self._measured(task, task.elapsed_ms)
+        task.elapsed_ms = 0.0
+        task.generator = None
+        task.runs += 1
+        task.due = tick + 1 + (task.phase - tick - 1) % task.period
+
+    def _step(self, task: Task, tick: int, deadline: float) -> bool:
+        perf_counter = time.perf_counter
+        start = perf_counter()
+        if task.generator is None:
+            task.started = tick
+            result = task.function()
+            if not inspect.isgenerator(result):
+                task.elapsed_ms += (perf_counter() - start) * 1000
+                self._finish(task, tick)
+                return True
+            task.generator = result
+        # generators yield between chunks of work and resume next tick
+        # when the budget runs out
+        while True:
+            try:
+                next(task.generator)
+            except StopIteration:
+                task.elapsed_ms += (perf_counter() - start) * 1000
+                self._finish(task, tick)
+                return True
+            if perf_counter() >= deadline:
+                task.elapsed_ms += (perf_counter() - start) * 1000
+                return False
+
+    def run(self, tick: int):
+        if not self._started:
+            self._started = True
+            for task in self._tasks.values():
+                self._anchor(task, tick)
+        perf_counter = time.perf_counter
+        start = perf_counter()
+        deadline = start + self._budget_ms / 1000
+        first = True
+        for task in self._candidates(tick):
+            if task.name not in self._tasks:
+                continue
+            remaining_ms = (deadline - perf_counter()) * 1000
+            # the most urgent task always makes progress, the rest wait
+            # for a tick with enough budget left
+            if not first and (remaining_ms <= 0 or task.cost_ms > remaining_ms):
+                continue
+            first = False
+            if not self._step(task, tick, deadline):
+                break
+        self._spent_ms = (perf_counter() - start) * 1000
+
+    def _updating(self, stepping: bool):
+        if stepping:
+            self.run(self._game.tick())
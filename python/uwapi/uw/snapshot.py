@@ -0,0 +1,56 @@
+import numpy as np
+
+from typing import Optional
+
+
+INVALID = 4294967295
+
+
+def _frozen(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+# immutable copy of the entity indexes, safe to hand to another thread or
+# pickle to another process; missing components are INVALID
+class Snapshot:
+    def __init__(
+        self,
+        tick: int,
+        my_force: int,
+        policies: dict,
+        ids: np.ndarray,
+        forces: np.ndarray,
+        protos: np.ndarray,
+        positions: np.ndarray,
+    ):
+        order = np.argsort(ids, kind="stable")
+        self.tick = tick
+        self.my_force = my_force
+        self.policies = dict(policies)
+        self.ids = _frozen(ids[order])
+        self.forces = _frozen(forces[order])
+        self.protos = _frozen(protos[order])
+        self.positions = _frozen(positions[order])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, _id: int) -> bool:
+        return self.index(_id) is not None
+
+    def index(self, _id: int) -> Optional[int]:
+        i = int(np.searchsorted(self.ids, _id))
+        if i < len(self.ids) and self.ids[i] == _id:
+            return i
+        return None
+
+    def own(self) -> np.ndarray:
+        return self.forces == self.my_force
+
+    def of_policy(self, policy) -> np.ndarray:
+        forces = [f for f, p in self.policies.items() if p == policy]
+        return np.isin(self.forces, np.array(forces, dtype=np.uint32))
+
+    def of_proto(self, proto: int) -> np.ndarray:
+        return self.protos == proto
@@ -0,0 +1,248 @@
+import math
+
+import numpy as np
+
+from typing import Iterable
+from typing import Optional
+
+from .helpers import MapState
+from .world import Entity
+
+
+# Entities bucketed into a uniform grid of cubes over the tile positions. The
+# buckets follow the entity callbacks of World, so the index is current by the
+# time update callbacks registered after it run.
+class SpatialIndex:
+    def __init__(self, game, cell_size: Optional[float] = None):
+        self._game = game
+        self._requested_cell_size: Optional[float] = cell_size
+        self._cell_size: float = 1.0
+        self._shape = np.ones(3, dtype=np.int64)
+        self._tile_coords = np.zeros((0, 3), dtype=np.int64)
+        self._tile_cells = np.zeros(0, dtype=np.int64)
+        self._positions = np.zeros((0, 3), dtype=np.float32)
+
+        self._tiles: dict[int, int] = {}
+        self._entities: dict[int, Entity] = {}
+        self._cells: dict[int, dict[int, Entity]] = {}
+        self._rings: list[np.ndarray] = []
+        self._allowed: dict[tuple, tuple[tuple, set[int]]] = {}
+
+        self._game.add_map_state_callback(self._map_state_changed)
+        self._game.world.add_entity_added_callback(self._entity_moved)
+        self._game.world.add_entity_changed_callback(self._entity_moved)
+        self._game.world.add_entity_removed_callback(self._entity_removed)
+        if self._game.map.tiles_count() > 0:
+            self._build()
+
+    def cell_size(self) -> float:
+        return self._cell_size
+
+    def count(self) -> int:
+        return len(self._tiles)
+
+    def tile_of(self, _id: int) -> Optional[int]:
+        return self._tiles.get(_id)
+
+    def _build(self):
+        positions = np.asarray(self._game.map.positions_array(), dtype=np.float32)
+        self._positions = positions
+        self._tiles.clear()
+        self._entities.clear()
+        self._cells.clear()
+        self._rings = []
+        if len(positions) == 0:
+            return
+        lower = positions.min(axis=0)
+        extent = float((positions.max(axis=0) - lower).max())
+        cell_size = self._requested_cell_size
+        if cell_size is None:
+            cell_size = max(extent / 32, 1e-3)
+        self._cell_size = cell_size
+        coords = ((positions - lower) / cell_size).astype(np.int64)
+        self._shape = coords.max(axis=0) + 1
+        self._tile_coords = coords
+        self._tile_cells = self._keys(coords)
+        for o in self._game.world.entities().values():
+            self._entity_moved(o)
+
+    def _keys(self, coords: np.ndarray) -> np.ndarray:
+        nx, ny, _ = self._shape.tolist()
+        return coords[..., 0] + nx * (coords[..., 1] + ny * coords[..., 2])
+
+    # offsets of the cells at chebyshev distance r
+    def _ring(self, r: int) -> np.ndarray:
+        while len(self._rings) <= r:
+            n = len(self._rings)
+            axis = np.arange(-n, n + 1)
+            cube = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), -1)
+            cube = cube.reshape(-1, 3)
+            self._rings.append(cube[np.abs(cube).max(axis=1) == n])
+        return self._rings[r]
+
+    def _entity_moved(self, o: Entity):
+        position = getattr(o, "Position", None)
+        tile = None if position is None else int(position.position)
+        if tile is not None and not 0 <= tile < len(self._tile_cells):
+            tile = None
+        previous = self._tiles.get(o.Id)
+        if previous == tile:
+            return
+        if previous is not None:
+            self._remove(o.Id, previous)
+        if tile is not None:
+            self._tiles[o.Id] = tile
+            self._entities[o.Id] = o
+            self._cells.setdefault(int(self._tile_cells[tile]), {})[o.Id] = o
+
+    def _entity_removed(self, o: Entity):
+        previous = self._tiles.get(o.Id)
+        if previous is not None:
+            self._remove(o.Id, previous)
+
+    def _remove(self, _id: int, tile: int):
+        del self._tiles[_id]
+        del self._entities[_id]
+        key = int(self._tile_cells[tile])
+        bucket = self._cells[key]
+        del bucket[_id]
+        if not bucket:
+            del self._cells[key]
+
+    def _map_state_changed(self, state: MapState):
+        if state == MapState.Loaded:
+            self._build()
+
+    # ids passing World.query(**filters), or None without filters
+    def _allowed_ids(self, filters: dict) -> Optional[set[int]]:
+        if not filters:
+            return None
+        key = tuple(
+            sorted((k, tuple(v) if k == "has" else v) for k, v in filters.items())
+        )
+        result = self._game.world.query(**filters)
+        cached = self._allowed.get(key)
+        if cached is not None and cached[0] is result:
+            return cached[1]
+        ids = {o.Id for o in result}
+        self._allowed[key] = (result, ids)
+        return ids
+
+    def _tiles_of(self, entities: list[Entity]) -> np.ndarray:
+        return np.fromiter(
+            (self._tiles[o.Id] for o in entities), dtype=np.int64, count=len(entities)
+        )
+
+    def _candidates(
+        self, allowed: Optional[set[int]]
+    ) -> tuple[list[Entity], np.ndarray]:
+        if allowed is None:
+            entities = list(self._entities.values())
+        else:
+            entities = [self._entities[i] for i in allowed if i in self._entities]
+        return entities, self._tiles_of(entities)
+
+    def _distances(self, tile: int, tiles: np.ndarray) -> np.ndarray:
+        return np.linalg.norm(self._positions[tiles] - self._positions[tile], axis=-1)
+
+    # indices of the k closest tiles and their distances, closest first
+    def _order(
+        self, tile: int, tiles: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        distances = self._distances(tile, tiles)
+        k = min(k, len(distances))
+        if k < len(distances):
+            closest = np.argpartition(distances, k - 1)[:k]
+        else:
+            closest = np.arange(len(distances))
+        closest = closest[np.argsort(distances[closest], kind="stable")]
+        return closest, distances[closest]
+
+    def _gather(
+        self, center: np.ndarray, r: int, allowed: Optional[set[int]]
+    ) -> list[Entity]:
+        cells = center + self._ring(r)
+        inside = ((cells >= 0) & (cells < self._shape)).all(axis=1)
+        found = []
+        for key in self._keys(cells[inside]).tolist():
+            bucket = self._cells.get(key)
+            if bucket is None:
+                continue
+            if allowed is None:
+                found.extend(bucket.values())
+            else:
+                found.extend(o for i, o in bucket.items() if i in allowed)
+        return found
+
+    def k_nearest(self, tile: int, k: int = 1, **filters) -> list[Entity]:
+        allowed = self._allowed_ids(filters)
+        limit = len(self._entities) if allowed is None else len(allowed)
+        if k <= 0 or limit == 0:
+            return []
+        # small candidate sets are cheaper to scan than the cells around tile
+        if limit > 64:
+            center = self._tile_coords[tile]
+            found = []
+            visited = 0
+            for r in range(int(self._shape.max())):
+                found.extend(self._gather(center, r, allowed))
+                if len(found) >= k:
+                    closest, distances = self._order(tile, self._tiles_of(found), k)
+                    # entities outside the rings seen are at least r cells away
+                    if distances[-1] <= r * self._cell_size:
+                        return [found[i] for i in closest.tolist()]
+                visited += len(self._ring(r))
+                if visited > limit:
+                    break
+        entities, tiles = self._candidates(allowed)
+        closest, _ = self._order(tile, tiles, k)
+        return [entities[i] for i in closest.tolist()]
+
+    def within_radius(self, tile: int, radius: float, **filters) -> list[Entity]:
+        allowed = self._allowed_ids(filters)
+        center = self._tile_coords[tile]
+        reach = int(math.ceil(radius / self._cell_size))
+        found = []
+        for r in range(min(reach, int(self._shape.max())) + 1):
+            found.extend(self._gather(center, r, allowed))
+        if not found:
+            return []
+        distances = self._distances(tile, self._tiles_of(found))
+        inside = np.flatnonzero(distances <= radius)
+        inside = inside[np.argsort(distances[inside], kind="stable")]
+        return [found[i] for i in inside.tolist()]
+
+    # one distance matrix per chunk of sources instead of a search per source
+    def k_nearest_many(
+        self, tiles: Iterable[int], k: int = 1, **filters
+    ) -> list[list[Entity]]:
+        sources = np.asarray(list(tiles), dtype=np.int64)
+        entities, candidates = self._candidates(self._allowed_ids(filters))
+        k = min(k, len(entities))
+        if k <= 0:
+            return [[] for _ in range(len(sources))]
+        result = []
+        targets = self._positions[candidates]
+        chunk = max(1, 4000000 // len(entities))
+        for begin in range(0, len(sources), chunk):
+            origins = self._positions[sources[begin : begin + chunk]]
+            distances = np.linalg.norm(
+                origins[:, None, :] - targets[None, :, :], axis=-1
+            )
+            if k < len(entities):
+                closest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            else:
+                closest = np.broadcast_to(
+                    np.arange(len(entities)), distances.shape
+                )
+            order = np.argsort(
+                np.take_along_axis(distances, closest, axis=1), axis=1, kind="stable"
+            )
+            closest = np.take_along_axis(closest, order, axis=1)
+            result.extend([entities[i] for i in row] for row in closest.tolist())
+        return result
+
+    def within_radius_many(
+        self, tiles: Iterable[int], radius: float, **filters
+    ) -> list[list[Entity]]:
+        return [self.within_radius(t, radius, **filters) for t in tiles]
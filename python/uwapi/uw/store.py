@@ -0,0 +1,188 @@
+import numpy as np
+
+from typing import Any
+from typing import Optional
+
+
+def _dtype_of(ffi, ctype) -> np.dtype:
+    if ctype.kind == "array":
+        item = _dtype_of(ffi, ctype.item)
+        return np.dtype((item, (ctype.length,)))
+    if ctype.kind == "struct":
+        names = []
+        formats = []
+        offsets = []
+        for name, field in ctype.fields:
+            names.append(name)
+            formats.append(_dtype_of(ffi, field.type))
+            offsets.append(field.offset)
+        return np.dtype(
+            {
+                "names": names,
+                "formats": formats,
+                "offsets": offsets,
+                "itemsize": ffi.sizeof(ctype),
+            }
+        )
+    if ctype.kind == "pointer":
+        return np.dtype(np.uintp)
+    if ctype.kind == "enum":
+        return np.dtype(f"i{ffi.sizeof(ctype)}")
+    if ctype.kind == "primitive":
+        if ctype.cname == "char":
+            return np.dtype("S1")
+        if ctype.cname in ("float", "double"):
+            return np.dtype(f"f{ffi.sizeof(ctype)}")
+        if ctype.cname == "_Bool":
+            return np.dtype("?")
+        signed = not ctype.cname.startswith("unsigned") and not ctype.cname.startswith(
+            "uint"
+        )
+        return np.dtype(f"{'i' if signed else 'u'}{ffi.sizeof(ctype)}")
+    raise TypeError(f"unsupported component field type: {ctype.cname}")
+
+
+def component_dtype(ffi, component: str) -> np.dtype:
+    return _dtype_of(ffi, ffi.typeof(f"struct Uw{component}Component"))
+
+
+class ComponentStore:
+    def __init__(self, ffi, components: list[str], capacity: int = 1024):
+        self._ffi = ffi
+        self._components: list[str] = list(components)
+        self._bits: dict[str, int] = {
+            c: 1 << i for i, c in enumerate(self._components)
+        }
+        self._dtypes: dict[str, np.dtype] = {
+            c: component_dtype(ffi, c) for c in self._components
+        }
+
+        self._slots: dict[int, int] = {}
+        self._free: list[int] = []
+        self._count: int = 0
+        self._capacity: int = 0
+        self._ids = np.zeros(0, dtype=np.uint32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._mask = np.zeros(0, dtype=np.uint32)
+        self._columns: dict[str, np.recarray] = {}
+        self._pointers: dict[str, Any] = {}
+        self._grow(capacity)
+
+    def components(self) -> list[str]:
+        return self._components
+
+    def dtype(self, component: str) -> np.dtype:
+        return self._dtypes[component]
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, _id: int) -> bool:
+        return _id in self._slots
+
+    def slot(self, _id: int) -> Optional[int]:
+        return self._slots.get(_id)
+
+    def size(self) -> int:
+        return self._count
+
+    def ids(self) -> np.ndarray:
+        return self._ids[: self._count]
+
+    def alive(self) -> np.ndarray:
+        return self._alive[: self._count]
+
+    def mask(self) -> np.ndarray:
+        return self._mask[: self._count]
+
+    def present(self, component: str) -> np.ndarray:
+        return (self.mask() & self._bits[component]) != 0
+
+    def column(self, component: str) -> np.recarray:
+        return self._columns[component][: self._count]
+
+    def has(self, _id: int, component: str) -> bool:
+        slot = self._slots.get(_id)
+        if slot is None or component not in self._bits:
+            return False
+        return bool(self._mask[slot] & self._bits[component])
+
+    # a copy, views into the columns would go stale when they grow
+    def get(self, _id: int, component: str) -> Optional[np.record]:
+        slot = self._slots.get(_id)
+        if slot is None or component not in self._bits:
+            return None
+        if not self._mask[slot] & self._bits[component]:
+            return None
+        return self._columns[component][slot : slot + 1].copy()[0]
+
+    def assign(self, _id: int) -> int:
+        slot = self._slots.get(_id)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self._count == self._capacity:
+                self._grow(self._capacity * 2)
+            slot = self._count
+            self._count += 1
+        self._slots[_id] = slot
+        self._ids[slot] = _id
+        self._alive[slot] = True
+        self._mask[slot] = 0
+        return slot
+
+    def release(self, _id: int):
+        slot = self._slots.pop(_id, None)
+        if slot is None:
+            return
+        self._alive[slot] = False
+        self._mask[slot] = 0
+        self._ids[slot] = 0
+        self._free.append(slot)
+
+    def clear(self):
+        self._slots = {}
+        self._free = []
+        self._count = 0
+        self._alive[:] = False
+        self._mask[:] = 0
+
+    def bit(self, component: str) -> int:
+        return self._bits[component]
+
+    def mask_of(self, slot: int) -> int:
+        return int(self._mask[slot])
+
+    def set_mask(self, slot: int, mask: int):
+        self._mask[slot] = mask
+
+    def pointer(self, component: str, slot: int):
+        return self._pointers[component] + slot
+
+    def set_present(self, slot: int, component: str, present: bool):
+        if present:
+            self._mask[slot] |= self._bits[component]
+        else:
+            self._mask[slot] &= ~np.uint32(self._bits[component])
+
+    def _grow(self, capacity: int):
+        capacity = max(capacity, 16)
+
+        def grown(old: np.ndarray, dtype) -> np.ndarray:
+            new = np.zeros(capacity, dtype=dtype)
+            new[: len(old)] = old
+            return new
+
+        self._ids = grown(self._ids, np.uint32)
+        self._alive = grown(self._alive, bool)
+        self._mask = grown(self._mask, np.uint32)
+        for c in self._components:
+            old = self._columns.get(c, np.zeros(0, dtype=self._dtypes[c]))
+            column = grown(old, self._dtypes[c]).view(np.recarray)
+            self._columns[c] = column
+            self._pointers[c] = self._ffi.cast(
+                f"struct Uw{c}Component *", self._ffi.from_buffer(column)
+            )
+        self._capacity = capacity
@@ -0,0 +1,526 @@
+import json
+import time
+
+import numpy as np
+
+from typing import Any
+
+from .backend import _CALLBACK_SETTERS
+from .backend import Backend
+from .helpers import ConnectionState
+from .helpers import GameState
+from .helpers import MapState
+from .helpers import OverviewFlags
+from .helpers import Prototype
+from .store import ComponentStore
+from .store import _dtype_of
+from .world import COMPONENTS
+from .world import Policy
+
+
+_CONNECT_FUNCTIONS = ("uwConnectDirect", "uwConnectLobbyId", "uwConnectNewServer")
+
+_METAL = 1
+_TANK_RECIPE = 2
+_DRILL_CONSTRUCTION = 3
+_NUCLEUS = 4
+_DRILL = 5
+_TANK = 6
+_DEPOSIT = 7
+
+_PROTOTYPES = {
+    _METAL: (Prototype.Resource, {"name": "metal"}),
+    _TANK_RECIPE: (
+        Prototype.Recipe,
+        {"name": "tank", "inputs": {str(_METAL): 10}, "outputs": {str(_TANK): 1}},
+    ),
+    _DRILL_CONSTRUCTION: (
+        Prototype.Construction,
+        {"name": "drill", "output": _DRILL, "inputs": {str(_METAL): 20}},
+    ),
+    _NUCLEUS: (Prototype.Unit, {"name": "nucleus", "recipes": [], "life": 5000}),
+    _DRILL: (Prototype.Unit, {"name": "drill", "recipes": [], "life": 1000}),
+    _TANK: (
+        Prototype.Unit,
+        {"name": "tank", "recipes": [], "life": 300, "dps": 10, "speed": 5},
+    ),
+    _DEPOSIT: (Prototype.Unit, {"name": "metal deposit", "recipes": []}),
+}
+
+_OVERVIEW = {
+    _DRILL_CONSTRUCTION: OverviewFlags.Construction.value,
+    _NUCLEUS: OverviewFlags.StaticUnit.value,
+    _DRILL: OverviewFlags.StaticUnit.value,
+    _TANK: OverviewFlags.MobileUnit.value,
+    _DEPOSIT: OverviewFlags.Resource.value,
+}
+
+_OVERVIEW_BY_PROTO = np.zeros(max(_PROTOTYPES) + 1, dtype=np.uint32)
+for _proto, _flag in _OVERVIEW.items():
+    _OVERVIEW_BY_PROTO[_proto] = _flag
+
+_COMPOSITION = {
+    _DRILL_CONSTRUCTION: ("Proto", "Owner", "Position", "Life"),
+    _NUCLEUS: ("Proto", "Owner", "Position", "Unit", "Life", "Recipe", "Priority"),
+    _DRILL: ("Proto", "Owner", "Position", "Unit", "Life", "Recipe", "Priority"),
+    _TANK: ("Proto", "Owner", "Position", "Unit", "Life", "Move", "Aim"),
+    _DEPOSIT: ("Proto", "Position", "Unit", "Amount"),
+}
+
+# spawned kinds and their weights
+_KINDS = np.array([_TANK, _DRILL, _DRILL_CONSTRUCTION, _DEPOSIT])
+_WEIGHTS = np.array([0.75, 0.1, 0.05, 0.1])
+
+
+# generated world served through the bots.h surface, see Game(backend=...)
+class SyntheticBackend(Backend):
+    def __init__(
+        self,
+        tiles: int = 10000,
+        entities: int = 1000,
+        forces: int = 2,
+        modified: float = 0.05,
+        churn: float = 0.001,
+        shooting: float = 0.1,
+        burst: int = 20,
+        policy_changes: float = 0.01,
+        tick_rate: float = 0,
+        ticks: int = 1000,
+        seed: int = 0,
+    ):
+        super().__init__()
+        self._width: int = max(1, int(np.sqrt(tiles)))
+        self._height: int = max(1, tiles // self._width)
+        self._entities_count: int = entities
+        self._forces_count: int = max(1, forces)
+        self._modified: float = modified
+        self._churn: float = churn
+        self._shooting: float = shooting
+        self._burst: int = burst
+        self._policy_changes: float = policy_changes
+        self._tick_rate: float = tick_rate
+        self._ticks: int = ticks
+        self._seed: int = seed
+
+        self._connection_state = ConnectionState.NONE
+        self._game_state = GameState.NONE
+        self._map_state = MapState.NONE
+        self._tick: int = 0
+        self._orders: dict[int, list] = {}
+
+    def open(self, ffi):
+        super().open(ffi)
+        self._strings: dict[Any, Any] = {}
+        self._shots_dtype = _dtype_of(ffi, ffi.typeof("struct UwShootingData"))
+        self._generate()
+        return self
+
+    def ticks(self) -> int:
+        return self._tick
+
+    def tiles_count(self) -> int:
+        return self._width * self._height
+
+    def entities_count(self) -> int:
+        return len(self._store)
+
+    def _string(self, key, value: str):
+        if key not in self._strings:
+            self._strings[key] = self._ffi.new("char[]", value.encode("utf-8"))
+        return self._strings[key]
+
+    def _generate(self):
+        self._rng = np.random.default_rng(self._seed)
+        self._generate_map()
+        self._store = ComponentStore(
+            self._ffi, list(COMPONENTS), self._entities_count + 64
+        )
+        self._next_id: int = 1
+        self._units: set[int] = set()
+        self._modified_ids: list[int] = []
+        self._modified_buffer = np.zeros(0, dtype=np.uint32)
+        self._all_buffer = np.zeros(0, dtype=np.uint32)
+        self._overview_tick: int = -1
+        self._overview_ids: dict[int, list[int]] = {}
+
+        self._forces = [self._spawn_force(i) for i in range(self._forces_count)]
+        self._policies: list[int] = []
+        for i, a in enumerate(self._forces):
+            for b in self._forces[i + 1 :]:
+                self._policies.append(self._spawn_policy(a, b))
+        self._player = self._spawn_player(self._forces[0])
+        for force in self._forces:
+            start = self._get("ForceDetails", force).startingPosition
+            self._spawn_unit(_NUCLEUS, force, start)
+        while len(self._units) < self._entities_count:
+            self._spawn_random()
+
+    def _generate_map(self):
+        w, h = self._width, self._height
+        count = w * h
+        x, y = np.meshgrid(np.arange(w), np.arange(h))
+        x = x.ravel()
+        y = y.ravel()
+        self._positions = np.zeros((count, 3), dtype=np.float32)
+        self._positions[:, 0] = x * 10
+        self._positions[:, 1] = y * 10
+        self._ups = np.zeros((count, 3), dtype=np.float32)
+        self._ups[:, 2] = 1
+        # 4-neighborhood on a torus, so every tile has exactly four neighbors
+        self._neighbors = np.stack(
+            [
+                y * w + (x + 1) % w,
+                y * w + (x - 1) % w,
+                ((y + 1) % h) * w + x,
+                ((y - 1) % h) * w + x,
+            ],
+            axis=1,
+        ).astype(np.uint32)
+        self._neighbors_pointer = self._ffi.cast(
+            "uint32 *", self._ffi.from_buffer(self._neighbors)
+        )
+        self._terrains = self._rng.integers(0, 4, count, dtype=np.uint8)
+        self._overview = np.zeros(count, dtype=np.uint32)
+
+    def _random_tile(self) -> int:
+        return int(self._rng.integers(0, self.tiles_count()))
+
+    def _get(self, component: str, _id: int):
+        return self._store.get(_id, component)
+
+    def _spawn(self, components: tuple) -> tuple[int, int]:
+        _id = self._next_id
+        self._next_id += 1
+        slot = self._store.assign(_id)
+        for c in components:
+            self._store.set_present(slot, c, True)
+            self._store.column(c)[slot] = np.zeros((), dtype=self._store.dtype(c))
+        self._modified_ids.append(_id)
+        return _id, slot
+
+    def _spawn_force(self, index: int) -> int:
+        _id, slot = self._spawn(("Force", "ForceDetails"))
+        self._store.column("Force").team[slot] = index
+        self._store.column("Force").color[slot] = self._rng.random(3)
+        self._store.column("ForceDetails").startingPosition[slot] = self._random_tile()
+        return _id
+
+    def _spawn_policy(self, a: int, b: int) -> int:
+        _id, slot = self._spawn(("ForeignPolicy",))
+        self._store.column("ForeignPolicy").forces[slot] = (a, b)
+        self._store.column("ForeignPolicy").policy[slot] = Policy.Enemy.value
+        return _id
+
+    def _spawn_player(self, force: int) -> int:
+        _id, slot = self._spawn(("Player",))
+        player = self._store.column("Player")
+        player.name[slot] = np.frombuffer(b"synthetic".ljust(28, b"\0"), dtype="S1")
+        player.nameLength[slot] = len(b"synthetic")
+        player.force[slot] = force
+        return _id
+
+    def _spawn_unit(self, proto: int, force: int, position: int) -> int:
+        _id, slot = self._spawn(_COMPOSITION[proto])
+        self._store.column("Proto").proto[slot] = proto
+        self._store.column("Position").position[slot] = position
+        if self._store.has(_id, "Owner"):
+            self._store.column("Owner").force[slot] = force
+        if self._store.has(_id, "Life"):
+            self._store.column("Life").life[slot] = _PROTOTYPES[proto][1].get(
+                "life", 100
+            )
+        if self._store.has(_id, "Amount"):
+            self._store.column("Amount").amount[slot] = 1000
+        if self._store.has(_id, "Recipe") and proto == _DRILL:
+            self._store.column("Recipe").recipe[slot] = _TANK_RECIPE
+        self._units.add(_id)
+        return _id
+
+    def _spawn_random(self) -> int:
+        proto = int(self._rng.choice(_KINDS, p=_WEIGHTS))
+        force = self._forces[int(self._rng.integers(0, len(self._forces)))]
+        return self._spawn_unit(proto, force, self._random_tile())
+
+    def _remove(self, _id: int):
+        self._store.release(_id)
+        self._units.discard(_id)
+        self._orders.pop(_id, None)
+
+    def _step(self):
+        self._modified_ids = []
+        units = np.fromiter(self._units, dtype=np.uint32, count=len(self._units))
+
+        churn = self._rng.binomial(len(units), self._churn) if len(units) else 0
+        if churn > 0:
+            removed = self._rng.choice(units, churn, replace=False)
+            for _id in removed.tolist():
+                self._remove(_id)
+            units = np.setdiff1d(units, removed, assume_unique=True)
+            for _ in range(churn):
+                self._spawn_random()
+
+        moved = self._rng.binomial(len(units), self._modified) if len(units) else 0
+        if moved > 0:
+            ids = self._rng.choice(units, moved, replace=False)
+            slots = np.fromiter(
+                (self._store.slot(_id) for _id in ids.tolist()), dtype=np.int64
+            )
+            protos = self._store.column("Proto").proto[slots]
+            mobile = slots[protos == _TANK]
+            position = self._store.column("Position").position
+            steps = self._rng.integers(0, 4, len(mobile))
+            position[mobile] = self._neighbors[position[mobile], steps]
+            life = self._store.column("Life").life
+            living = slots[self._store.present("Life")[slots]]
+            life[living] = np.maximum(life[living] - 1, 1)
+            self._modified_ids.extend(ids.tolist())
+
+        if self._policies and self._rng.random() < self._policy_changes:
+            _id = self._policies[int(self._rng.integers(0, len(self._policies)))]
+            policy = self._rng.choice(
+                [Policy.Ally.value, Policy.Neutral.value, Policy.Enemy.value]
+            )
+            self._store.column("ForeignPolicy").policy[self._store.slot(_id)] = policy
+            self._modified_ids.append(_id)
+
+    def _shots(self):
+        if self._burst <= 0 or self._rng.random() >= self._shooting:
+            return None
+        units = np.fromiter(self._units, dtype=np.uint32, count=len(self._units))
+        if len(units) == 0:
+            return None
+        shots = np.zeros(self._burst, dtype=self._shots_dtype)
+        for side in ("shooter", "target"):
+            ids = self._rng.choice(units, self._burst)
+            slots = np.fromiter(
+                (self._store.slot(_id) for _id in ids.tolist()), dtype=np.int64
+            )
+            shots[side]["id"] = ids
+            shots[side]["prototype"] = self._store.column("Proto").proto[slots]
+            shots[side]["position"] = self._store.column("Position").position[slots]
+            shots[side]["force"] = self._store.column("Owner").force[slots]
+        return shots
+
+    def _fire_shots(self, shots: np.ndarray):
+        data = self._ffi.new("struct UwShootingArray *")
+        buf = self._ffi.from_buffer(shots)
+        data.data = self._ffi.cast("UwShootingData *", buf)
+        data.count = len(shots)
+        self._fire("uwSetShootingCallback", data)
+
+    def _set_connection_state(self, state: ConnectionState):
+        self._connection_state = state
+        self._fire("uwSetConnectionStateCallback", state.value)
+
+    def _set_game_state(self, state: GameState):
+        self._game_state = state
+        self._fire("uwSetGameStateCallback", state.value)
+
+    def _set_map_state(self, state: MapState):
+        self._map_state = state
+        self._fire("uwSetMapStateCallback", state.value)
+
+    def run(self) -> bool:
+        self._set_connection_state(ConnectionState.Connecting)
+        self._set_connection_state(ConnectionState.Connected)
+        self._set_map_state(MapState.Loading)
+        self._set_map_state(MapState.Loaded)
+        self._set_game_state(GameState.Session)
+        self._set_game_state(GameState.Game)
+        interval = 1 / self._tick_rate if self._tick_rate > 0 else 0
+        deadline = time.perf_counter()
+        for tick in range(self._ticks):
+            self._tick = tick
+            if tick > 0:
+                self._step()
+            self._keep = []
+            self._fire("uwSetUpdateCallback", tick, True)
+            shots = self._shots()
+            if shots is not None:
+                self._fire_shots(shots)
+            if interval > 0:
+                deadline += interval
+                delay = deadline - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        self._set_game_state(GameState.Finish)
+        self._set_map_state(MapState.Unloading)
+        self._set_map_state(MapState.NONE)
+        self._set_connection_state(ConnectionState.NONE)
+        return True
+
+    def uwConnectFindLan(self, timeout: int) -> bool:
+        return self.run()
+
+    def uwTryReconnect(self) -> bool:
+        return False
+
+    def uwConnectionState(self) -> int:
+        return self._connection_state.value
+
+    def uwGameState(self) -> int:
+        return self._game_state.value
+
+    def uwMapState(self) -> int:
+        return self._map_state.value
+
+    def uwMyPlayer(self, data) -> bool:
+        data.playerEntityId = self._player
+        data.forceEntityId = self._forces[0]
+        data.primaryController = True
+        data.admin = True
+        return True
+
+    def uwAllPrototypes(self, data):
+        self._set_ids(data, list(_PROTOTYPES))
+
+    def uwPrototypeType(self, _id: int) -> int:
+        return _PROTOTYPES[_id][0].value if _id in _PROTOTYPES else 0
+
+    def uwPrototypeJson(self, _id: int):
+        if _id not in _PROTOTYPES:
+            return self._ffi.NULL
+        return self._string(_id, json.dumps(_PROTOTYPES[_id][1]))
+
+    def uwDefinitionsJson(self):
+        definitions = {"hitChancesTable": [], "terrainTypesTable": []}
+        return self._string("definitions", json.dumps(definitions))
+
+    def uwMapInfo(self, data) -> bool:
+        data.name = self._string("name", "synthetic")
+        data.guid = self._string("guid", f"synthetic-{self.tiles_count()}")
+        data.path = self._string("path", "")
+        data.maxPlayers = self._forces_count
+        return True
+
+    def uwTilesCount(self) -> int:
+        return self.tiles_count()
+
+    def uwTile(self, index: int, data):
+        data.position = self._positions[index].tolist()
+        data.up = self._ups[index].tolist()
+        data.neighborsIndices = self._neighbors_pointer + index * 4
+        data.neighborsCount = 4
+        data.terrain = int(self._terrains[index])
+        data.border = False
+
+    def _update_overview(self):
+        if self._overview_tick == self._tick:
+            return
+        self._overview_tick = self._tick
+        self._overview_ids = {}
+        self._overview[:] = 0
+        present = self._store.present("Position") & self._store.alive()
+        positions = self._store.column("Position").position[present]
+        protos = self._store.column("Proto").proto[present]
+        np.bitwise_or.at(self._overview, positions, _OVERVIEW_BY_PROTO[protos])
+
+    def uwOverviewFlags(self, position: int) -> int:
+        self._update_overview()
+        return int(self._overview[position])
+
+    def uwOverviewIds(self, position: int, data):
+        self._update_overview()
+        if not self._overview_ids:
+            present = self._store.present("Position") & self._store.alive()
+            ids = self._store.ids()[present].tolist()
+            positions = self._store.column("Position").position[present].tolist()
+            for _id, p in zip(ids, positions):
+                self._overview_ids.setdefault(p, []).append(_id)
+        self._set_ids(data, self._overview_ids.get(position, []))
+
+    def uwOverviewExtract(self, data):
+        self._update_overview()
+        data.flags = self._ffi.cast(
+            "UwOverviewFlags *", self._ffi.from_buffer(self._overview)
+        )
+        data.count = len(self._overview)
+
+    def uwDistanceLine(self, x1, y1, z1, x2, y2, z2) -> float:
+        return float(np.linalg.norm([x1 - x2, y1 - y2, z1 - z2]))
+
+    def uwDistanceEstimate(self, a: int, b: int) -> float:
+        return float(np.linalg.norm(self._positions[a] - self._positions[b]))
+
+    def uwYaw(self, position: int, towards: int) -> float:
+        d = self._positions[towards] - self._positions[position]
+        return float(np.arctan2(d[1], d[0]))
+
+    def uwTestVisible(self, *args) -> bool:
+        return True
+
+    def uwTestShooting(self, *args) -> bool:
+        return True
+
+    def uwTestConstructionPlacement(self, proto: int, position: int) -> bool:
+        self._update_overview()
+        return self._overview[position] == 0
+
+    def uwFindConstructionPlacement(self, proto: int, position: int) -> int:
+        return position
+
+    def uwAllEntities(self, data):
+        self._all_buffer = self._store.ids()[self._store.alive()].copy()
+        data.ids = self._ffi.cast("uint32 *", self._ffi.from_buffer(self._all_buffer))
+        data.count = len(self._all_buffer)
+
+    def uwModifiedEntities(self, data):
+        self._modified_buffer = np.array(self._modified_ids, dtype=np.uint32)
+        data.ids = self._ffi.cast(
+            "uint32 *", self._ffi.from_buffer(self._modified_buffer)
+        )
+        data.count = len(self._modified_buffer)
+
+    def _fetch(self, component: str, entity, data) -> bool:
+        slot = self._store.slot(self.uwEntityId(entity))
+        if slot is None or not self._store.mask_of(slot) & self._store.bit(component):
+            return False
+        pointer = self._store.pointer(component, slot)
+        self._ffi.memmove(data, pointer, self._ffi.sizeof(pointer[0]))
+        return True
+
+    def uwOrders(self, unit: int, data):
+        orders = self._orders.get(unit, [])
+        arr = self._ffi.new("UwOrder[]", len(orders))
+        for o, (entity, position, order, priority) in zip(arr, orders):
+            o.entity = entity
+            o.position = position
+            o.order = order
+            o.priority = priority
+        self._keep.append(arr)
+        data.orders = arr
+        data.count = len(orders)
+
+    def uwOrder(self, unit: int, data):
+        if unit not in self._units:
+            return
+        order = (data.entity, data.position, data.order, data.priority)
+        if data.priority & 4:  # enqueue
+            self._orders.setdefault(unit, []).append(order)
+        else:
+            self._orders[unit] = [order]
+
+    def __getattr__(self, name: str):
+        if name in _CALLBACK_SETTERS:
+            return super().__getattr__(name)
+        if name in _CONNECT_FUNCTIONS:
+
+            def connect(*args):
+                self.run()
+
+            return connect
+        if name.startswith("uwFetch") and name.endswith("Component"):
+            component = name[len("uwFetch") : -len("Component")]
+
+            def fetch(entity, data) -> bool:
+                return self._fetch(component, entity, data)
+
+            setattr(self, name, fetch)
+            return fetch
+        if name.startswith("uw"):
+
+            def ignored(*args):
+                return None
+
+            return ignored
+        raise AttributeError(name)
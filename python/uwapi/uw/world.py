@@ -1,7 +1,41 @@
+import numpy as np
+
+from collections import defaultdict
 from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Optional
 from enum import Enum
 
+from .helpers import MapState
+from .helpers import Prototype
 from .helpers import _unpack_list
+from .snapshot import INVALID
+from .snapshot import Snapshot
+from .store import ComponentStore
+
+
+COMPONENTS = (
+    "Proto",
+    "Owner",
+    "Controller",
+    "Position",
+    "Unit",
+    "Life",
+    "Move",
+    "Aim",
+    "Recipe",
+    "UpdateTimestamp",
+    "RecipeStatistics",
+    "Priority",
+    "Amount",
+    "Attachment",
+    "Player",
+    "Force",
+    "ForceDetails",
+    "ForeignPolicy",
+    "DiplomacyProposal",
+)
 
 
 class Policy(Enum):
@@ -12,9 +46,39 @@ class Policy(Enum):
     Enemy = 4
 
 
+# components World itself reads for indexes and policies, never fetched lazily
+_INDEXED_COMPONENTS = {"Proto", "Owner", "Position", "ForeignPolicy"}
+
+
 class Entity:
-    def __init__(self, world):
+    __slots__ = (
+        "_world",
+        "Id",
+        "_handle",
+        "_handle_tick",
+        "_mask",
+        "_fetched",
+    ) + COMPONENTS
+
+    def __init__(self, world, _id: int = 0):
         self._world = world
+        self.Id = _id
+        self._handle = None
+        self._handle_tick: int = -1
+        self._mask: int = 0
+        self._fetched: int = 0
+
+    def __getattr__(self, name: str):
+        world = self._world
+        if world._store is not None:
+            component = world._store.get(self.Id, name)
+            if component is not None:
+                return component
+        elif world._lazy:
+            component = world._fetch_lazy(self, name)
+            if component is not None:
+                return component
+        raise AttributeError(name)
 
     def has(self, component: str):
         return hasattr(self, component)
@@ -29,16 +93,90 @@ class Entity:
         return self._world.policy(self.Owner.force)
 
 
+class _ComponentFetch:
+    __slots__ = ("name", "bit", "fetch", "ctype", "size", "scratch", "scratch_bytes")
+
+    def __init__(self, api, ffi, name: str, bit: int):
+        self.name = name
+        self.bit = bit
+        self.fetch = getattr(api, f"uwFetch{name}Component")
+        self.ctype = ffi.typeof(f"struct Uw{name}Component *")
+        self.size = ffi.sizeof(self.ctype.item)
+        self.scratch = ffi.new(self.ctype)
+        self.scratch_bytes = ffi.buffer(self.scratch)
+
+
 class World:
-    def __init__(self, api, ffi, game):
+    def __init__(
+        self,
+        api,
+        ffi,
+        game,
+        components: Optional[set[str]] = None,
+        columnar: bool = False,
+        lazy: bool = False,
+    ):
         self._api = api
         self._ffi = ffi
         self._game = game
 
+        if lazy and columnar:
+            raise ValueError("lazy and columnar modes are mutually exclusive")
+
+        if components is None:
+            components = set(COMPONENTS)
+        unknown = set(components) - set(COMPONENTS)
+        if unknown:
+            raise ValueError(f"unknown components: {', '.join(sorted(unknown))}")
+        # the policy table is maintained from ForeignPolicy components
+        components = set(components) | {"ForeignPolicy"}
+        self._components: tuple[str, ...] = tuple(
+            c for c in COMPONENTS if c in components
+        )
+        self._fetch_plan: list[_ComponentFetch] = [
+            _ComponentFetch(api, ffi, c, 1 << i) for i, c in enumerate(self._components)
+        ]
+        self._lazy: bool = lazy
+        self._lazy_plan: dict[str, _ComponentFetch] = {}
+        if lazy:
+            self._lazy_plan = {
+                f.name: f for f in self._fetch_plan if f.name not in _INDEXED_COMPONENTS
+            }
+            self._fetch_plan = [
+                f for f in self._fetch_plan if f.name in _INDEXED_COMPONENTS
+            ]
+        self._lazy_mask: int = sum(f.bit for f in self._lazy_plan.values())
+        self._ids = ffi.new("struct UwIds *")
+        self._player = ffi.new("struct UwMyPlayer *")
+
         self._my_force: int = 0
         self._entities: dict[int, Any] = {}
         self._policies: dict[int, Policy] = {}
+        self._foreign_policies: dict[int, tuple[int, int, Policy]] = {}
+        self._policy_changed_handler = []
+        self._store: Optional[ComponentStore] = (
+            ComponentStore(ffi, list(self._components)) if columnar else None
+        )
+
+        self._index_keys: dict[int, tuple] = {}
+        self._by_force: dict[int, dict[int, Entity]] = {}
+        self._by_proto: dict[int, dict[int, Entity]] = {}
+        self._at_tile: dict[int, dict[int, Entity]] = {}
+
+        self._versions: defaultdict[str, int] = defaultdict(int)
+        self._dirty: dict[str, dict[int, Entity]] = {c: {} for c in self._components}
+        self._queries: dict[tuple, tuple[tuple, tuple[Entity, ...]]] = {}
+
+        self._reconcile_interval: int = 100
+        self._ticks_since_reconcile: int = 0
+        self._added: list[Entity] = []
+        self._changed: list[Entity] = []
+        self._removed: list[Entity] = []
+        self._entity_added_handler = []
+        self._entity_changed_handler = []
+        self._entity_removed_handler = []
 
+        self._game.add_map_state_callback(self._map_state_changed)
         self._game.add_update_callback(self._updating)
 
     def my_force(self) -> int:
@@ -53,80 +191,407 @@ class World:
     def policy(self, force: int) -> Policy:
         return self._policies.get(force, Policy.NONE)
 
+    def components(self) -> tuple[str, ...]:
+        return self._components
+
+    def columnar(self) -> bool:
+        return self._store is not None
+
+    def lazy(self) -> bool:
+        return self._lazy
+
+    def store(self) -> Optional[ComponentStore]:
+        return self._store
+
+    def by_force(self, force: int) -> list[Entity]:
+        return list(self._by_force.get(force, {}).values())
+
+    def own_entities(self) -> list[Entity]:
+        return self.by_force(self._my_force)
+
+    def by_proto(self, proto: int) -> list[Entity]:
+        return list(self._by_proto.get(proto, {}).values())
+
+    def by_proto_type(self, proto_type: Prototype) -> list[Entity]:
+        prototypes = self._game.prototypes
+        result = []
+        for proto, index in self._by_proto.items():
+            if prototypes.type(proto) == proto_type:
+                result.extend(index.values())
+        return result
+
+    def at_tile(self, position: int) -> list[Entity]:
+        return list(self._at_tile.get(position, {}).values())
+
+    def query(
+        self,
+        own: Optional[bool] = None,
+        policy: Optional[Policy] = None,
+        has: Iterable[str] = (),
+        proto_type: Optional[Prototype] = None,
+        proto_name: Optional[str] = None,
+        proto: Optional[int] = None,
+    ) -> tuple[Entity, ...]:
+        has = tuple(sorted(has))
+        key = (own, policy, has, proto_type, proto_name, proto)
+        deps = ["entities"]
+        if own is not None or policy is not None:
+            deps += ["Owner", "force"]
+        if policy is not None:
+            deps.append("policy")
+        if proto_type is not None or proto_name is not None or proto is not None:
+            deps += ["Proto", "prototypes"]
+        deps += has
+        versions = tuple(self._versions[d] for d in deps)
+        cached = self._queries.get(key)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+
+        if own:
+            candidates = self._by_force.get(self._my_force, {}).values()
+        elif proto is not None or proto_type is not None or proto_name is not None:
+            prototypes = self._game.prototypes
+            candidates = []
+            for p, index in self._by_proto.items():
+                if proto is not None and p != proto:
+                    continue
+                if proto_type is not None and prototypes.type(p) != proto_type:
+                    continue
+                if proto_name is not None and prototypes.name(p) != proto_name:
+                    continue
+                candidates.extend(index.values())
+        else:
+            candidates = self._entities.values()
+
+        prototypes = self._game.prototypes
+        result = []
+        for o in candidates:
+            if own is not None and o.own() != own:
+                continue
+            if policy is not None and o.policy() != policy:
+                continue
+            if proto is not None or proto_type is not None or proto_name is not None:
+                p = self._index_keys.get(o.Id, (None, None, None))[1]
+                if p is None:
+                    continue
+                if proto is not None and p != proto:
+                    continue
+                if proto_type is not None and prototypes.type(p) != proto_type:
+                    continue
+                if proto_name is not None and prototypes.name(p) != proto_name:
+                    continue
+            if not all(o.has(c) for c in has):
+                continue
+            result.append(o)
+        result = tuple(result)
+        self._queries[key] = (versions, result)
+        return result
+
+    def count(self, **filters) -> int:
+        return len(self.query(**filters))
+
+    def changed(self, component: str) -> list[Entity]:
+        return list(self._dirty.get(component, {}).values())
+
+    def policies(self) -> dict[int, Policy]:
+        return self._policies
+
+    def snapshot(self) -> Snapshot:
+        count = len(self._index_keys)
+        ids = np.fromiter(self._index_keys.keys(), dtype=np.uint32, count=count)
+        keys = np.fromiter(
+            (
+                INVALID if k is None else k
+                for keys in self._index_keys.values()
+                for k in keys
+            ),
+            dtype=np.uint32,
+            count=count * 3,
+        ).reshape(count, 3)
+        return Snapshot(
+            self._game.tick(),
+            self._my_force,
+            self._policies,
+            ids,
+            keys[:, 0],
+            keys[:, 1],
+            keys[:, 2],
+        )
+
+    def add_policy_changed_callback(self, callback: Callable[[int, Policy], None]):
+        self._policy_changed_handler.append(callback)
+
+    def set_reconcile_interval(self, ticks: int):
+        self._reconcile_interval = ticks
+
+    def add_entity_added_callback(self, callback: Callable[[Entity], None]):
+        self._entity_added_handler.append(callback)
+
+    def add_entity_changed_callback(self, callback: Callable[[Entity], None]):
+        self._entity_changed_handler.append(callback)
+
+    def add_entity_removed_callback(self, callback: Callable[[Entity], None]):
+        self._entity_removed_handler.append(callback)
+
     def _all_ids(self) -> list[int]:
-        ids = self._ffi.new("struct UwIds *")
-        self._api.uwAllEntities(ids)
-        return _unpack_list(self._ffi, ids)
+        self._api.uwAllEntities(self._ids)
+        return _unpack_list(self._ffi, self._ids)
 
     def _modified_ids(self) -> list[int]:
-        ids = self._ffi.new("struct UwIds *")
-        self._api.uwModifiedEntities(ids)
-        return _unpack_list(self._ffi, ids)
+        self._api.uwModifiedEntities(self._ids)
+        return _unpack_list(self._ffi, self._ids)
+
+    def _alive_ids(self) -> np.ndarray:
+        if self._ids.count == 0:
+            return np.zeros(0, dtype=np.uint32)
+        return np.frombuffer(
+            self._ffi.buffer(self._ids.ids, self._ids.count * 4), dtype=np.uint32
+        )
 
     def _update_removed(self):
-        all_ids = set(self._all_ids())
-        removed = []
-        for _id in self._entities.keys():
-            if _id not in all_ids:
-                removed.append(_id)
-        for _id in removed:
-            del self._entities[_id]
-
-    def _maybe_assign_or_remove(self, e, o, fetch_method):
-        struct = fetch_method.replace("uwFetch", "Uw")
-        field = fetch_method.replace("uwFetch", "").replace("Component", "")
-        tmp = self._ffi.new(f"struct {struct} *")
-        if getattr(self._api, fetch_method)(e, tmp):
-            setattr(o, field, tmp)
-        else:
-            if hasattr(o, field):
-                delattr(o, field)
+        # every live entity shows up in uwModifiedEntities when it appears,
+        # so matching counts mean nothing was removed since the last tick
+        self._api.uwAllEntities(self._ids)
+        self._ticks_since_reconcile += 1
+        if (
+            self._ids.count == len(self._entities)
+            and self._ticks_since_reconcile < self._reconcile_interval
+        ):
+            return
+        self._ticks_since_reconcile = 0
+        known = np.fromiter(
+            self._entities.keys(), dtype=np.uint32, count=len(self._entities)
+        )
+        for _id in np.setdiff1d(known, self._alive_ids()).tolist():
+            self._removed.append(self._entities.pop(_id))
+            for dirty in self._dirty.values():
+                dirty.pop(_id, None)
+
+    def _update_modified_columnar(self):
+        store = self._store
+        buffer = self._ffi.buffer
+        memmove = self._ffi.memmove
+        entity_pointer = self._api.uwEntityPointer
+        for _id in self._modified_ids():
+            o = self._entities.get(_id)
+            if o is None:
+                o = Entity(self, _id)
+                self._entities[_id] = o
+                self._added.append(o)
+            else:
+                self._changed.append(o)
+            slot = store.assign(_id)
+            e = entity_pointer(_id)
+            previous = store.mask_of(slot)
+            mask = 0
+            for f in self._fetch_plan:
+                if f.fetch(e, f.scratch):
+                    mask |= f.bit
+                    target = store.pointer(f.name, slot)
+                    if previous & f.bit and buffer(target) == f.scratch_bytes:
+                        continue
+                    memmove(target, f.scratch, f.size)
+                    self._dirty[f.name][_id] = o
+                elif previous & f.bit:
+                    self._dirty[f.name][_id] = o
+            if mask != previous:
+                store.set_mask(slot, mask)
+                for f in self._fetch_plan:
+                    if (mask ^ previous) & f.bit:
+                        self._versions[f.name] += 1
 
     def _update_modified(self):
+        if self._store is not None:
+            self._update_modified_columnar()
+            return
+        new = self._ffi.new
+        buffer = self._ffi.buffer
+        memmove = self._ffi.memmove
+        entity_pointer = self._api.uwEntityPointer
+        tick = self._game.tick()
         for _id in self._modified_ids():
-            o = self._entities.get(_id, Entity(self))
-            o.Id = _id
-            self._entities[_id] = o
-            e = self._api.uwEntityPointer(_id)
-
-            self._maybe_assign_or_remove(e, o, "uwFetchProtoComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchOwnerComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchControllerComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchPositionComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchUnitComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchLifeComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchMoveComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchAimComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchRecipeComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchUpdateTimestampComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchRecipeStatisticsComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchPriorityComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchAmountComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchAttachmentComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchPlayerComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchForceComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchForceDetailsComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchForeignPolicyComponent")
-            self._maybe_assign_or_remove(e, o, "uwFetchDiplomacyProposalComponent")
-
-    def _update_policies(self):
-        self._policies = {}
-        for e in self._entities.values():
-            if not hasattr(e, "ForeignPolicy"):
-                continue
-            fp = getattr(e, "ForeignPolicy")
-            forces = self._ffi.unpack(fp.forces, 2)
-            policy = Policy(fp.policy)
-            if forces[0] == self._my_force:
-                self._policies[forces[1]] = policy
-            if forces[1] == self._my_force:
-                self._policies[forces[0]] = policy
+            o = self._entities.get(_id)
+            if o is None:
+                o = Entity(self, _id)
+                self._entities[_id] = o
+                self._added.append(o)
+            else:
+                self._changed.append(o)
+            e = entity_pointer(_id)
+            mask = o._mask
+            for f in self._fetch_plan:
+                if f.fetch(e, f.scratch):
+                    if mask & f.bit:
+                        current = getattr(o, f.name)
+                        if buffer(current) == f.scratch_bytes:
+                            continue
+                        memmove(current, f.scratch, f.size)
+                    else:
+                        setattr(o, f.name, f.scratch)
+                        f.scratch = new(f.ctype)
+                        f.scratch_bytes = buffer(f.scratch)
+                        mask |= f.bit
+                        self._versions[f.name] += 1
+                    self._dirty[f.name][_id] = o
+                elif mask & f.bit:
+                    delattr(o, f.name)
+                    mask &= ~f.bit
+                    self._versions[f.name] += 1
+                    self._dirty[f.name][_id] = o
+            if self._lazy:
+                # drop components cached from before this modification; their
+                # previous bytes are unknown, so they are reported as changed
+                for f in self._lazy_plan.values():
+                    if mask & f.bit:
+                        delattr(o, f.name)
+                    self._dirty[f.name][_id] = o
+                mask &= ~self._lazy_mask
+                o._fetched = 0
+                o._handle = e
+                o._handle_tick = tick
+            o._mask = mask
+        if self._lazy and (self._added or self._changed):
+            # presence of lazy components is unknown until they are read
+            for name in self._lazy_plan:
+                self._versions[name] += 1
+
+    def _fetch_lazy(self, o: Entity, name: str):
+        f = self._lazy_plan.get(name)
+        if f is None or o._fetched & f.bit:
+            return None
+        tick = self._game.tick()
+        if o._handle_tick != tick:
+            o._handle = self._api.uwEntityPointer(o.Id)
+            o._handle_tick = tick
+        o._fetched |= f.bit
+        if o._handle == self._ffi.NULL:
+            return None
+        component = self._ffi.new(f.ctype)
+        if not f.fetch(o._handle, component):
+            return None
+        setattr(o, name, component)
+        o._mask |= f.bit
+        return component
+
+    @staticmethod
+    def _index_move(index: dict, old, new, o: Entity):
+        if old == new:
+            return
+        if old is not None:
+            bucket = index[old]
+            del bucket[o.Id]
+            if not bucket:
+                del index[old]
+        if new is not None:
+            index.setdefault(new, {})[o.Id] = o
+
+    def _reindex(self, o: Entity, keys: Optional[tuple]):
+        old = self._index_keys.pop(o.Id, (None, None, None))
+        if keys is not None:
+            self._index_keys[o.Id] = keys
+        else:
+            keys = (None, None, None)
+        if old[0] != keys[0]:
+            self._versions["Owner"] += 1
+        if old[1] != keys[1]:
+            self._versions["Proto"] += 1
+        self._index_move(self._by_force, old[0], keys[0], o)
+        self._index_move(self._by_proto, old[1], keys[1], o)
+        self._index_move(self._at_tile, old[2], keys[2], o)
+
+    def _update_indexes(self):
+        if self._added or self._removed:
+            self._versions["entities"] += 1
+        for o in self._removed:
+            self._reindex(o, None)
+        for entities in (self._added, self._changed):
+            for o in entities:
+                owner = getattr(o, "Owner", None)
+                proto = getattr(o, "Proto", None)
+                position = getattr(o, "Position", None)
+                keys = (
+                    None if owner is None else int(owner.force),
+                    None if proto is None else int(proto.proto),
+                    None if position is None else int(position.position),
+                )
+                if self._index_keys.get(o.Id) != keys:
+                    self._reindex(o, keys)
+
+    def _update_policies(self, force_changed: bool):
+        changed = force_changed
+        for o in self._removed:
+            if self._foreign_policies.pop(o.Id, None) is not None:
+                changed = True
+        for entities in (self._added, self._changed):
+            for o in entities:
+                fp = getattr(o, "ForeignPolicy", None)
+                if fp is None:
+                    if self._foreign_policies.pop(o.Id, None) is not None:
+                        changed = True
+                    continue
+                forces = [int(f) for f in fp.forces]
+                entry = (forces[0], forces[1], Policy(int(fp.policy)))
+                if self._foreign_policies.get(o.Id) != entry:
+                    self._foreign_policies[o.Id] = entry
+                    changed = True
+        if force_changed:
+            self._versions["force"] += 1
+        if not changed:
+            return
+
+        self._versions["policy"] += 1
+        policies = {}
+        for a, b, policy in self._foreign_policies.values():
+            if a == self._my_force:
+                policies[b] = policy
+            if b == self._my_force:
+                policies[a] = policy
+        previous, self._policies = self._policies, policies
+        for force in previous.keys() | policies.keys():
+            policy = policies.get(force, Policy.NONE)
+            if previous.get(force, Policy.NONE) != policy:
+                for eh in self._policy_changed_handler:
+                    eh(force, policy)
+
+    def _map_state_changed(self, map_state: MapState):
+        if map_state == MapState.Loaded:
+            self._versions["prototypes"] += 1
 
     def _updating(self, stepping: bool):
-        player = self._ffi.new("struct UwMyPlayer *")
-        self._api.uwMyPlayer(player)
-        self._my_force = player.forceEntityId
+        self._api.uwMyPlayer(self._player)
+        force_changed = self._my_force != self._player.forceEntityId
+        self._my_force = self._player.forceEntityId
+
+        for dirty in self._dirty.values():
+            dirty.clear()
 
-        self._update_removed()
         self._update_modified()
-        self._update_policies()
+        self._update_removed()
+        self._update_indexes()
+        self._update_policies(force_changed)
+        self._dispatch_events()
+
+    # removed entities keep their last components, as in the eager mode
+    def _detach(self, o: Entity):
+        for name in self._components:
+            component = self._store.get(o.Id, name)
+            if component is not None:
+                setattr(o, name, component)
+        self._store.release(o.Id)
+
+    def _dispatch_events(self):
+        added, self._added = self._added, []
+        changed, self._changed = self._changed, []
+        removed, self._removed = self._removed, []
+        for eh in self._entity_removed_handler:
+            for o in removed:
+                eh(o)
+        if self._store is not None:
+            for o in removed:
+                self._detach(o)
+        for eh in self._entity_added_handler:
+            for o in added:
+                eh(o)
+        for eh in self._entity_changed_handler:
+            for o in changed:
+                eh(o)